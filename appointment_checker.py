@@ -4,6 +4,7 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select
 from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
 import time
 from datetime import datetime, timedelta
 from selenium.webdriver.chrome.options import Options
@@ -12,30 +13,760 @@ from tempfile import mkdtemp
 from dotenv import load_dotenv
 import json
 import asyncio
-from telegram import Bot
 import logging
 import signal
 import sys
+import queue
+import threading
+import zlib
+from html.parser import HTMLParser
+from urllib.parse import parse_qsl, urlsplit
+import httpx
+import logging_setup
+from cdp import CDPConnection, CDPError
+from availability import AvailabilitySnapshot, start_availability_server
+from metrics import METRICS, is_timeout, start_metrics_server
+from notifier import TelegramNotifier
+from polling import AdaptivePoller
+from slot_store import SlotStore
+from slots import OfficeScan, Slot, diff_slots, parse_label, to_timestamp
+from subscribers import Subscriber, group_by_region, load_subscribers
+
+DEFAULT_BASE_URL = "https://solicitudeswebrc.srcei.cl"
+INIT_PATH = "/ReservaDeHoraSRCEI/web/init.srcei"
+# Form fields sent to SEARCH_ENDPOINT; {region}, {office} and {date} are filled per search
+DEFAULT_SEARCH_PARAMS = "idRegion={region}&idOficina={office}&fechaSeleccionadaDesde={date}"
+
+# Seconds allowed for each step before giving up; override with TIMEOUTS=step=seconds,...
+DEFAULT_TIMEOUTS = {
+    'page': 15,     # Page loads and the login form appearing
+    'module': 10,   # The "Reimpresión cédula" module button
+    'offices': 10,  # Office list refreshing after a region is selected
+    'search': 10    # A date search settling
+}
+POLL_FREQUENCY = 0.05
+
+# Installs (once per page) counters for XHR/fetch requests and DOM mutations,
+# and returns a snapshot of them to compare against after triggering an action
+ARM_READINESS_JS = """
+if (!window.__srceiReadiness) {
+    const state = window.__srceiReadiness = {requests: 0, pending: 0, mutations: 0, lastMutation: 0};
+    const finished = () => { state.pending--; };
+    const send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        state.requests++;
+        state.pending++;
+        this.addEventListener('loadend', finished);
+        return send.apply(this, arguments);
+    };
+    if (window.fetch) {
+        const fetch = window.fetch;
+        window.fetch = function() {
+            state.requests++;
+            state.pending++;
+            return fetch.apply(this, arguments).finally(finished);
+        };
+    }
+    new MutationObserver(records => {
+        state.mutations += records.length;
+        state.lastMutation = performance.now();
+    }).observe(document.body, {childList: true, subtree: true, attributes: true});
+}
+const state = window.__srceiReadiness;
+return {requests: state.requests, mutations: state.mutations};
+"""
+
+# True once the page settled after an action armed with ARM_READINESS_JS:
+# the requests it started have finished (or, if it made none, the DOM changed
+# and has been quiet briefly) and the search loader is not showing
+SETTLED_JS = """
+const since = arguments[0], state = window.__srceiReadiness;
+if (!state) return true;
+const loader = document.getElementById('idBuscarHoraLoaderContainer');
+if (loader && loader.offsetParent !== null) return false;
+if (state.requests > since.requests) return state.pending === 0;
+return state.mutations > since.mutations && performance.now() - state.lastMutation > 100;
+"""
+
+OFFICES_READY_JS = """
+const select = document.getElementById('selectOficinas');
+return !!select && select.options.length > 1;
+"""
+
+# The CDP backend runs each step as one async function in the page: a
+# shared polling helper plus the region selection and the whole search
+# (office, date, click, settle, read the cards) in a single round trip.
+# Failures are thrown as "SessionExpired", "NoSuchOffice: ..." or "Timed out ...".
+CDP_HELPERS_JS = """
+const arm = function() {""" + ARM_READINESS_JS + """};
+const settled = function() {""" + SETTLED_JS + """};
+const officesReady = function() {""" + OFFICES_READY_JS + """};
+const deadline = performance.now() + timeout;
+const until = async (condition, what) => {
+    while (!condition()) {
+        if (document.getElementById('cu_inputRUN')) throw new Error('SessionExpired');
+        if (performance.now() > deadline) throw new Error('Timed out waiting for ' + what);
+        await new Promise(resolve => setTimeout(resolve, 50));
+    }
+};
+"""
+
+CDP_SELECT_REGION_JS = """async function(region, timeout) {""" + CDP_HELPERS_JS + """
+await until(() => document.getElementById('selectRegion'), 'the region list');
+const select = document.getElementById('selectRegion');
+if (select.value !== region || !officesReady()) {
+    const since = arm();
+    select.value = region;
+    select.dispatchEvent(new Event('change', {bubbles: true}));
+    await until(() => settled(since) && officesReady(), 'the office list');
+}
+return Array.from(document.getElementById('selectOficinas').options).map(o => o.textContent.trim());
+}"""
+
+CDP_SEARCH_JS = """async function(office, date, timeout) {""" + CDP_HELPERS_JS + """
+const select = document.getElementById('selectOficinas');
+await until(() => select && select.options.length > 1, 'the office list');
+const option = Array.from(select.options).find(o => o.textContent.trim() === office);
+if (!option) throw new Error('NoSuchOffice: ' + office);
+if (select.value !== option.value) {
+    select.value = option.value;
+    select.dispatchEvent(new Event('change', {bubbles: true}));
+}
+const field = document.getElementById('idFechaSeleccionadaDesde');
+await until(() => field, 'the date field');
+field.removeAttribute('readonly');
+field.value = date;
+field.dispatchEvent(new Event('change', {bubbles: true}));
+const button = () => document.getElementById('idBtnBuscarFechaDisponible');
+await until(() => button() && !button().disabled, 'the search button');
+const since = arm();
+button().click();
+await until(() => settled(since) && document.getElementById('idHorasDisponiblesContainer'), 'the search');
+// An expired session settles too, with the login form rendered as the results
+if (document.getElementById('cu_inputRUN')) throw new Error('SessionExpired');
+const cards = document.querySelectorAll('#idHorasDisponiblesContainer .card:not([style*="display: none"])');
+return Array.from(cards).map(card => ['h1', 'h5', 'h6'].map(tag => card.querySelector(tag).textContent.trim()).join(' '));
+}"""
+
+def parse_timeouts(value):
+    # "page=20,search=5" -> DEFAULT_TIMEOUTS with those steps overridden
+    timeouts = dict(DEFAULT_TIMEOUTS)
+    for entry in (value or '').split(','):
+        if '=' in entry:
+            step, seconds = entry.split('=', 1)
+            timeouts[step.strip()] = float(seconds)
+    return timeouts
+
+# Lean browser profile: resource types and URLs Chromium never fetches
+RESOURCE_EXTENSIONS = {
+    'image': ('png', 'jpg', 'jpeg', 'gif', 'webp', 'svg', 'ico', 'bmp'),
+    'font': ('woff', 'woff2', 'ttf', 'otf', 'eot'),
+    'media': ('mp4', 'webm', 'mp3', 'ogg', 'wav'),
+    'stylesheet': ('css',),
+}
+DEFAULT_BLOCKED_TYPES = ('image', 'font', 'media')
+DEFAULT_BLOCKED_URLS = (
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+    '*facebook.net*', '*hotjar.com*', '*clarity.ms*'
+)
+LEAN_BROWSER_ARGS = (
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--no-first-run',
+    '--mute-audio',
+)
+
+def parse_list(value, default=()):
+    if value is None:
+        return list(default)
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+def blocked_url_patterns(lean_profile):
+    # Network.setBlockedURLs only takes URL patterns, so resource types are
+    # blocked by file extension (with or without a query string)
+    patterns = list(lean_profile.get('block_urls', ()))
+    for resource_type in lean_profile.get('block_types', ()):
+        for extension in RESOURCE_EXTENSIONS.get(resource_type, ()):
+            patterns.extend([f'*.{extension}', f'*.{extension}?*'])
+    return patterns
+
+def env_flag(name, default=False):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+def process_tree_rss_mb(root_pid):
+    # Sum the resident memory of a process and all of its descendants
+    # (chromedriver plus every Chromium process it spawned). Linux only.
+    children = {}
+    rss_kb = {}
+    try:
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry}/status') as f:
+                    ppid = None
+                    rss = 0
+                    for line in f:
+                        if line.startswith('PPid:'):
+                            ppid = int(line.split()[1])
+                        elif line.startswith('VmRSS:'):
+                            rss = int(line.split()[1])
+            except (OSError, ValueError):
+                continue
+            pid = int(entry)
+            rss_kb[pid] = rss
+            children.setdefault(ppid, []).append(pid)
+    except OSError:
+        return None
+
+    if root_pid not in rss_kb:
+        return None
+    total = 0
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        total += rss_kb.get(pid, 0)
+        pending.extend(children.get(pid, []))
+    return total / 1024
 
 def setup_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('appointment_checker.log'),
-            logging.StreamHandler()  # This will also print to console
-        ]
+    # LOG_FILE='' logs to the console only; LOG_ROTATE_WHEN=midnight rotates
+    # daily instead of every LOG_MAX_MB
+    logging_setup.setup_logging(
+        os.getenv('LOG_FILE', 'appointment_checker.log'),
+        level=os.getenv('LOG_LEVEL', 'INFO'),
+        json_lines=os.getenv('LOG_FORMAT', 'text').lower() == 'json',
+        max_bytes=int(float(os.getenv('LOG_MAX_MB', '10')) * 1024 * 1024),
+        backups=int(os.getenv('LOG_BACKUPS', '5')),
+        when=os.getenv('LOG_ROTATE_WHEN') or None
     )
+    # httpx logs every request at INFO
+    logging.getLogger('httpx').setLevel(logging.WARNING)
     return logging.getLogger(__name__)
 
+def observe_search(office, date, started, appointments=None, error=None):
+    # Metrics for one date search, plus a debug line (off at the default level)
+    seconds = time.monotonic() - started
+    METRICS.observe_search(office, seconds, error)
+    logger = logging.getLogger(__name__)
+    if logger.isEnabledFor(logging.DEBUG):
+        outcome = f"failed: {str(error)}" if error is not None else f"{len(appointments)} appointments"
+        logger.debug(
+            f"Searched {office} from {date.strftime('%d/%m/%Y')} in {seconds:.2f}s, {outcome}",
+            extra={'office': office, 'date': date, 'phase': 'search', 'duration': seconds}
+        )
+
+class SessionExpiredError(Exception):
+    pass
+
+class OfficeNotFoundError(LookupError):
+    # The office is not in the region's office list
+    pass
+
+class SlotCardParser(HTMLParser):
+    # Extracts the visible appointment cards (h1 day, h5 month, h6 time)
+    # from the HTML the search endpoint renders into idHorasDisponiblesContainer
+    def __init__(self):
+        super().__init__()
+        self.cards = []
+        self._card = None
+        self._depth = 0
+        self._field = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'div':
+            if self._card is not None:
+                self._depth += 1
+            elif 'card' in (attrs.get('class') or '').split() and 'display: none' not in (attrs.get('style') or ''):
+                self._card = {}
+                self._depth = 1
+        elif self._card is not None and tag in ('h1', 'h5', 'h6'):
+            self._field = tag
+            self._card[tag] = ''
+
+    def handle_endtag(self, tag):
+        if tag == self._field:
+            self._field = None
+        elif tag == 'div' and self._card is not None:
+            self._depth -= 1
+            if self._depth == 0:
+                if all(key in self._card for key in ('h1', 'h5', 'h6')):
+                    self.cards.append(' '.join(
+                        ' '.join(self._card[key].split()) for key in ('h1', 'h5', 'h6')
+                    ))
+                self._card = None
+
+    def handle_data(self, data):
+        if self._field:
+            self._card[self._field] += data
+
+def parse_slot_cards(body):
+    # The endpoint may answer with the HTML fragment itself or with JSON
+    # wrapping it, so collect every string in a JSON payload before parsing
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        html = body
+    else:
+        strings = []
+        pending = [payload]
+        while pending:
+            value = pending.pop()
+            if isinstance(value, str):
+                strings.append(value)
+            elif isinstance(value, dict):
+                pending.extend(reversed(list(value.values())))
+            elif isinstance(value, list):
+                pending.extend(reversed(value))
+        html = '\n'.join(strings)
+
+    parser = SlotCardParser()
+    parser.feed(html)
+    parser.close()
+    return parser.cards
+
+class SeleniumSearchBackend:
+    # Drives the search form in the logged-in browser, one date at a time
+    name = 'selenium'
+
+    def __init__(self, checker):
+        self.checker = checker
+        self.driver = checker.driver
+        self.current_office = None
+
+    def prepare(self, region_id):
+        self.current_office = None
+
+    def select_office(self, office):
+        with METRICS.span('select_office'):
+            office_dropdown = Select(self.checker.wait_for('offices',
+                EC.presence_of_element_located((By.ID, "selectOficinas"))
+            ))
+            office_dropdown.select_by_visible_text(office)
+        self.current_office = office
+
+    def search(self, office, date):
+        if office != self.current_office:
+            self.select_office(office)
+
+        try:
+            # Find and update date field
+            date_field = self.checker.wait_for('search',
+                EC.presence_of_element_located((By.ID, "idFechaSeleccionadaDesde"))
+            )
+            self.driver.execute_script("arguments[0].removeAttribute('readonly')", date_field)
+            date_field.clear()
+            date_field.send_keys(date.strftime("%d/%m/%Y"))
+            
+            # Click search button
+            search_button = self.checker.wait_for('search',
+                EC.element_to_be_clickable((By.ID, "idBtnBuscarFechaDisponible"))
+            )
+            since = self.driver.execute_script(ARM_READINESS_JS)
+            search_button.click()
+
+            # Wait for the search request to finish rather than for the loader
+            # to show up, since a fast answer can hide it before we look
+            self.checker.wait_for('search', lambda driver: driver.execute_script(SETTLED_JS, since))
+
+            self.checker.wait_for('search',
+                EC.presence_of_element_located((By.ID, "idHorasDisponiblesContainer"))
+            )
+        except TimeoutException:
+            if self.checker.is_session_expired():
+                raise SessionExpiredError("Redirected to login page during search")
+            raise
+        # Get all card data at once using a single JavaScript execution. An
+        # expired session can also settle normally, with the login form
+        # rendered where the cards should be; that is not an empty result.
+        cards_data = self.driver.execute_script("""
+            if (document.getElementById('cu_inputRUN')) return null;
+            const cards = document.querySelectorAll('#idHorasDisponiblesContainer .card:not([style*="display: none"])');
+            return Array.from(cards).map(card => ({
+                day: card.querySelector('h1').textContent.trim(),
+                month: card.querySelector('h5').textContent.trim(),
+                time: card.querySelector('h6').textContent.trim()
+            }));
+        """)
+        if cards_data is None:
+            raise SessionExpiredError("Search returned the login page")
+        return [f"{card['day']} {card['month']} {card['time']}" for card in cards_data]
+
+    def close(self):
+        pass
+
+class HttpSearchBackend:
+    # Calls the endpoint behind the "Buscar" button directly with the
+    # browser's session cookies, skipping the DOM round trips entirely
+    name = 'http'
+
+    def __init__(self, base_url, endpoint, cookies=None, office_codes=None,
+                 params_template=None, method='POST', user_agent=None, timeout=10):
+        self.endpoint = endpoint
+        self.office_codes = office_codes or {}
+        self.params_template = params_template or DEFAULT_SEARCH_PARAMS
+        self.method = method.upper()
+        self.region_id = None
+        headers = {'X-Requested-With': 'XMLHttpRequest'}
+        if user_agent:
+            headers['User-Agent'] = user_agent
+        self.client = httpx.Client(
+            base_url=base_url,
+            cookies=cookies,
+            headers=headers,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=10)
+        )
+
+    @classmethod
+    def from_driver(cls, driver, endpoint, **kwargs):
+        if not endpoint:
+            raise ValueError("SEARCH_ENDPOINT is not configured")
+
+        cookies = httpx.Cookies()
+        for cookie in driver.get_cookies():
+            cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+
+        # Map office names to the option values the endpoint expects
+        office_codes = driver.execute_script("""
+            const options = document.querySelectorAll('#selectOficinas option');
+            return Object.fromEntries(Array.from(options).map(o => [o.textContent.trim(), o.value]));
+        """)
+
+        parts = urlsplit(driver.current_url)
+        return cls(
+            f"{parts.scheme}://{parts.netloc}",
+            endpoint,
+            cookies=cookies,
+            office_codes=office_codes,
+            user_agent=driver.execute_script("return navigator.userAgent"),
+            **kwargs
+        )
+
+    def prepare(self, region_id):
+        self.region_id = region_id
+
+    def select_office(self, office):
+        if office not in self.office_codes:
+            raise OfficeNotFoundError(f"Office {office} is not offered for region {self.region_id}")
+
+    def search(self, office, date):
+        self.select_office(office)
+        values = {
+            'region': self.region_id,
+            'office': self.office_codes[office],
+            'date': date.strftime("%d/%m/%Y")
+        }
+        params = [(key, value.format(**values)) for key, value in parse_qsl(self.params_template)]
+
+        if self.method == 'GET':
+            response = self.client.get(self.endpoint, params=params)
+        else:
+            response = self.client.post(self.endpoint, data=dict(params))
+
+        if response.is_redirect or 'cu_inputRUN' in response.text:
+            raise SessionExpiredError("Search endpoint redirected to login")
+        response.raise_for_status()
+        return parse_slot_cards(response.text)
+
+    def close(self):
+        self.client.close()
+
+class CdpSearchBackend:
+    # Runs the searches in several tabs of the logged-in browser, talking to
+    # it over the DevTools protocol from one event loop on a background
+    # thread: every tab has one search in flight and each search is a single
+    # command. Results are handed back to the calling thread for merging.
+    # The tabs are kept open across runs, like the worker browsers.
+    name = 'cdp'
+
+    def __init__(self, checker, tabs=1):
+        self.checker = checker
+        self.timeouts = checker.timeouts
+        self.tab_count = max(1, tabs)
+        self.url = checker.driver.current_url
+        # Command-line switches cover every tab, but request blocking is per tab
+        self.blocked_urls = blocked_url_patterns(checker.lean_profile) if checker.lean_profile else []
+        self.region_id = None
+        self.offices = set()
+        self.connection = None
+        self.tabs = []
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='cdp-search', daemon=True)
+        self.thread.start()
+        try:
+            self._run(self._open(checker.debugging_port))
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def alive(self):
+        return self.thread.is_alive() and self.connection is not None and not self.connection.reader_task.done()
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def _open(self, debugging_port):
+        self.connection = await CDPConnection.connect_browser(debugging_port)
+        # Tabs share the browser's cookies, so they all start logged in
+        for _ in range(self.tab_count):
+            # Open blank, so request blocking is in place before the form loads
+            tab = await self.connection.open_tab('about:blank')
+            self.tabs.append(tab)
+            if self.blocked_urls:
+                await tab.send('Network.enable')
+                await tab.send('Network.setBlockedURLs', {'urls': self.blocked_urls})
+        await asyncio.gather(*(self._load_form(tab) for tab in self.tabs))
+
+    async def _load_form(self, tab):
+        await tab.send('Page.navigate', {'url': self.url}, timeout=self.timeouts['page'])
+        await self._wait_for_form(tab)
+
+    async def _page_state(self, tab):
+        try:
+            return await tab.call("""function() {
+                if (document.getElementById('cu_inputRUN')) return 'login';
+                if (document.readyState === 'complete' && document.getElementById('selectRegion')) return 'form';
+                return null;
+            }""", timeout=self.timeouts['page'])
+        except CDPError:
+            return None  # Still navigating
+
+    async def _wait_for_form(self, tab):
+        deadline = time.monotonic() + self.timeouts['page']
+        while True:
+            state = await self._page_state(tab)
+            if state == 'login':
+                raise SessionExpiredError("Tab landed on the login page")
+            if state == 'form':
+                return
+            if time.monotonic() > deadline:
+                raise TimeoutError("Timed out waiting for the search form in a tab")
+            await asyncio.sleep(POLL_FREQUENCY)
+
+    async def _call(self, tab, function, *args, step='search'):
+        try:
+            return await tab.call(function, *args, self.timeouts[step] * 1000, timeout=self.timeouts[step] + 5)
+        except CDPError as e:
+            message = str(e)
+            if 'SessionExpired' in message:
+                raise SessionExpiredError("Redirected to login page during search")
+            if 'NoSuchOffice' in message:
+                raise OfficeNotFoundError(f"Office {message.split('NoSuchOffice: ', 1)[-1]} is not offered for region {self.region_id}")
+            if 'Timed out' in message:
+                raise TimeoutError(message.split('Error: ', 1)[-1])
+            # The page navigated away mid-search; find out where it went
+            await self._wait_for_form(tab)
+            raise
+
+    async def _ensure_form(self, tab):
+        # A tab kept from an earlier run may have been logged out since (the
+        # browser logs in again before the run) or left somewhere else
+        if await self._page_state(tab) != 'form':
+            await self._load_form(tab)
+
+    async def _prepare(self, region_id):
+        await asyncio.gather(*(self._ensure_form(tab) for tab in self.tabs))
+        office_lists = await asyncio.gather(*(
+            self._call(tab, CDP_SELECT_REGION_JS, str(region_id), step='offices') for tab in self.tabs
+        ))
+        self.offices = set(office_lists[0])
+
+    def prepare(self, region_id):
+        self.region_id = region_id
+        with METRICS.span('select_region'):
+            self._run(self._prepare(region_id))
+
+    def select_office(self, office):
+        if office not in self.offices:
+            raise OfficeNotFoundError(f"Office {office} is not offered for region {self.region_id}")
+
+    async def _search(self, tab, office, date):
+        return await self._call(tab, CDP_SEARCH_JS, office, date.strftime("%d/%m/%Y"))
+
+    def search(self, office, date):
+        return self._run(self._search(self.tabs[0], office, date))
+
+    async def _search_all(self, items, results):
+        work = asyncio.Queue()
+        for item in items:
+            work.put_nowait(item)
+
+        async def worker(tab):
+            while not work.empty():
+                office, date = work.get_nowait()
+                started = time.monotonic()
+                try:
+                    appointments = await self._search(tab, office, date)
+                    observe_search(office, date, started, appointments)
+                    results.put((office, date, appointments, None))
+                except SessionExpiredError as e:
+                    observe_search(office, date, started, error=e)
+                    # No point searching further with an expired session
+                    while not work.empty():
+                        work.get_nowait()
+                    results.put((office, date, None, e))
+                except Exception as e:
+                    observe_search(office, date, started, error=e)
+                    results.put((office, date, None, e))
+
+        try:
+            await asyncio.gather(*(worker(tab) for tab in self.tabs))
+        finally:
+            results.put(None)
+
+    def search_all(self, items):
+        # Yields (office, date, appointments, error) as each search finishes
+        results = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(self._search_all(items, results), self.loop)
+        try:
+            while True:
+                result = results.get()
+                if result is None:
+                    break
+                yield result
+        finally:
+            future.cancel()
+
+    async def _close(self):
+        for tab in self.tabs:
+            await tab.close()
+        self.tabs = []
+        if self.connection:
+            await self.connection.close()
+
+    def close(self):
+        if self.thread.is_alive():
+            try:
+                asyncio.run_coroutine_threadsafe(self._close(), self.loop).result(10)
+            except Exception:
+                pass
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(5)
+        self.loop.close()
+
+class ProbeScheduler:
+    # Two-tier scanning: every cycle probes each office with a single search
+    # from today and keeps a fingerprint of the answer. The deep scan over
+    # DAYS_TO_SEARCH only runs for offices whose fingerprint changed, or
+    # whose last deep scan is older than full_refresh_interval seconds.
+    def __init__(self, full_refresh_interval=900):
+        self.full_refresh_interval = full_refresh_interval
+        self.fingerprints = {}
+        self.deep_scanned_at = {}
+        self.inventory = {}  # Appointments found by each office's last deep scan
+
+    @staticmethod
+    def fingerprint(appointments):
+        return zlib.crc32('\n'.join(sorted(appointments)).encode('utf-8'))
+
+    def needs_deep_scan(self, office, probe_appointments):
+        if self.fingerprints.get(office) != self.fingerprint(probe_appointments):
+            return True
+        return time.monotonic() - self.deep_scanned_at[office] >= self.full_refresh_interval
+
+    def record_deep_scan(self, office, probe_appointments, appointments):
+        self.fingerprints[office] = self.fingerprint(probe_appointments)
+        self.deep_scanned_at[office] = time.monotonic()
+        self.inventory[office] = list(appointments)
+
+def classify_error(error):
+    # 'session': logged out, log in again; 'timeout' and 'network': the site
+    # is slow or down; 'missing': the office or a form element is not there
+    if isinstance(error, SessionExpiredError):
+        return 'session'
+    if is_timeout(error):
+        return 'timeout'
+    if isinstance(error, (OfficeNotFoundError, NoSuchElementException)):
+        return 'missing'
+    if isinstance(error, httpx.TransportError):
+        return 'network'
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code >= 500:
+        return 'network'
+    if isinstance(error, WebDriverException) and 'net::ERR_' in str(error):
+        return 'network'
+    return 'other'
+
+class CircuitBreaker:
+    # Per-office circuit breaker: after `threshold` consecutive failures (or
+    # one 'missing' error) an office is skipped for `cooldown` seconds, then
+    # gets a single trial search. A failed trial opens it again for twice as
+    # long, up to max_cooldown; a successful search closes it.
+    def __init__(self, threshold=3, cooldown=600, max_cooldown=3600):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = {}  # office -> consecutive failures
+        self.cooldowns = {}  # office -> cooldown of its last opening
+        self.open_until = {}  # office -> monotonic time it may be tried again
+
+    def allows(self, office):
+        return time.monotonic() >= self.open_until.get(office, 0)
+
+    def record_success(self, office):
+        self.failures.pop(office, None)
+        self.cooldowns.pop(office, None)
+        self.open_until.pop(office, None)
+
+    def record_failure(self, office, kind):
+        # Returns the cooldown in seconds if this failure opened the circuit
+        self.failures[office] = self.failures.get(office, 0) + 1
+        trial = office in self.cooldowns
+        if not (trial or kind == 'missing' or self.failures[office] >= self.threshold):
+            return None
+        cooldown = min(self.cooldowns[office] * 2, self.max_cooldown) if trial else self.cooldown
+        self.cooldowns[office] = cooldown
+        self.open_until[office] = time.monotonic() + cooldown
+        self.failures[office] = 0
+        return cooldown
+
 class AppointmentChecker:
-    def __init__(self, run, password, telegram_token=None, telegram_chat_id=None):
+    def __init__(self, run, password, telegram_token=None, telegram_chat_id=None,
+                 search_backend='selenium', search_endpoint=None, search_params=None, search_method='POST',
+                 debugging_port=9222, timeouts=None, base_url=DEFAULT_BASE_URL, notifier=None, store=None,
+                 lean_profile=None, cache_dir=None, snapshot=None, scans=None):
         self.run = run
         self.password = password
         self.telegram_token = telegram_token
         self.telegram_chat_id = telegram_chat_id
-        self.state_file = 'appointment_state.json'
+        # A notifier passed in is shared and outlives this checker; one we
+        # create ourselves is closed with it
+        self.owns_notifier = notifier is None
+        self.notifier = notifier or TelegramNotifier(telegram_token, telegram_chat_id)
+        self.owns_store = store is None
+        self.store = store or SlotStore()
+        self.search_backend = search_backend
+        self.search_endpoint = search_endpoint
+        self.search_params = search_params
+        self.search_method = search_method
+        self.debugging_port = debugging_port
+        self.timeouts = timeouts or dict(DEFAULT_TIMEOUTS)
+        self.base_url = base_url
+        self.init_url = base_url.rstrip('/') + INIT_PATH
+        self.workers = []  # Extra browsers for parallel scanning
+        self.cdp_backend = None  # DevTools tabs, kept across runs
+        self.desde_search = False  # Set once a search returns cards past its date
+        self.state_file = 'appointment_state.json'  # Only read to migrate to the store
+        self.lean_profile = lean_profile  # {'block_types', 'block_urls', 'allow_domains'} or None
+        self.cache_dir = cache_dir  # HTTP cache kept across browser restarts
+        self.snapshot = snapshot  # AvailabilitySnapshot updated after every run, if any
+        # Office -> OfficeScan from earlier runs, to tell what changed since;
+        # passed in to outlive this checker like the store
+        self.scans = {} if scans is None else scans
         
+        self.driver, self.user_data_dir = self.launch_browser()
+        self.logger = logging.getLogger(__name__)
+        self.started_at = time.monotonic()
+        self.logged_in = False
+
+    def launch_browser(self):
         # Setup Chrome options
         chrome_options = Options()
         chrome_options.binary_location = "/snap/bin/chromium"
@@ -58,7 +789,25 @@ class AppointmentChecker:
         chrome_options.add_argument('--disable-web-security')
         chrome_options.add_argument('--dns-prefetch-disable')
         chrome_options.add_argument('--disable-features=VizDisplayCompositor')
-        chrome_options.add_argument('--remote-debugging-port=9222')
+        chrome_options.add_argument(f'--remote-debugging-port={self.debugging_port}')
+
+        if self.cache_dir:
+            # One cache per debugging port, Chromium does not share a cache between browsers
+            cache_dir = os.path.join(os.path.abspath(self.cache_dir), str(self.debugging_port))
+            os.makedirs(cache_dir, exist_ok=True)
+            chrome_options.add_argument(f'--disk-cache-dir={cache_dir}')
+
+        if self.lean_profile:
+            for argument in LEAN_BROWSER_ARGS:
+                chrome_options.add_argument(argument)
+            if 'image' in self.lean_profile.get('block_types', ()):
+                chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+            allow_domains = self.lean_profile.get('allow_domains')
+            if allow_domains:
+                # Any host outside the allow list (and the site itself) fails to resolve
+                hosts = [urlsplit(self.base_url).hostname] + list(allow_domains)
+                rules = ['MAP * ~NOTFOUND'] + [f'EXCLUDE {pattern}' for host in hosts for pattern in (host, f'*.{host}')]
+                chrome_options.add_argument(f'--host-resolver-rules={", ".join(rules)}')
         
         # Add additional headers
         chrome_options.add_argument('--disable-blink-features=AutomationControlled')
@@ -67,341 +816,671 @@ class AppointmentChecker:
         # Setup ChromeDriver service with local path
         service = Service('./chromedriver')
         
-        self.driver = webdriver.Chrome(
+        driver = webdriver.Chrome(
             service=service,
             options=chrome_options
         )
-        self.wait = WebDriverWait(self.driver, 10)
-        self.user_data_dir = user_data_dir  # Store for cleanup
-        self.logger = logging.getLogger(__name__)
+        if self.lean_profile:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': blocked_url_patterns(self.lean_profile)})
+        return driver, user_data_dir  # Keep the directory for cleanup
 
     def login(self):
         # Navigate to the website
-        self.driver.get("https://solicitudeswebrc.srcei.cl/ReservaDeHoraSRCEI/web/init.srcei")
-        
-        # Wait for page to be fully loaded
-        self.wait.until(
-            EC.presence_of_element_located((By.TAG_NAME, "body"))
-        )
-        time.sleep(2)  # Additional wait for dynamic content
+        self.driver.get(self.init_url)
         
-        # Find and fill the username (RUN) field
-        username_field = self.wait.until(
-            EC.presence_of_element_located((By.ID, "cu_inputRUN"))
+        # Find and fill the username (RUN) field as soon as it can take input
+        username_field = self.wait_for('page',
+            EC.element_to_be_clickable((By.ID, "cu_inputRUN"))
         )
         username_field.send_keys(self.run)
 
         # Find and fill the password field
-        password_field = self.wait.until(
+        password_field = self.wait_for('page',
             EC.presence_of_element_located((By.ID, "cu_inputClaveUnica"))
         )
         password_field.send_keys(self.password)
 
         # Click the authenticate button with correct ID
-        auth_button = self.wait.until(
+        auth_button = self.wait_for('page',
             EC.element_to_be_clickable((By.ID, "cu_btnIngresar"))
         )
         auth_button.click()
+        self.logged_in = True
+
+    def is_session_expired(self):
+        # The site bounces expired sessions back to the ClaveÚnica login form
+        return bool(self.driver.find_elements(By.ID, "cu_inputRUN"))
+
+    def prepare_search_form(self):
+        # Leave the browser on the region/office form, reusing the current
+        # session when possible. Returns True if a fresh login was needed.
+        if self.logged_in:
+            if self.driver.find_elements(By.ID, "selectRegion") and not self.is_session_expired():
+                return False
+
+            self.driver.get(self.init_url)
+            self.wait_for('page', EC.any_of(
+                EC.presence_of_element_located((By.ID, "cu_inputRUN")),
+                EC.presence_of_element_located((By.ID, "9"))
+            ))
+            if not self.is_session_expired():
+                with METRICS.span('navigate'):
+                    self.navigate_to_reimpresion()
+                return False
+
+            self.logger.info("Session expired, logging in again")
+
+        with METRICS.span('login'):
+            self.login()
+        with METRICS.span('navigate'):
+            self.navigate_to_reimpresion()
+        return True
+
+    def session_age(self):
+        return time.monotonic() - self.started_at
+
+    def session_rss_mb(self):
+        try:
+            total = process_tree_rss_mb(self.driver.service.process.pid)
+        except AttributeError:
+            return None
+        if total is not None:
+            for worker in self.workers:
+                total += worker.session_rss_mb() or 0
+        return total
+
+    def needs_recycle(self, max_rss_mb=None, max_age=None):
+        if max_age and self.session_age() > max_age:
+            self.logger.info(f"Browser session is {self.session_age():.0f}s old (limit {max_age}s)")
+            return True
+        if max_rss_mb:
+            rss = self.session_rss_mb()
+            if rss is not None and rss > max_rss_mb:
+                self.logger.info(f"Browser session uses {rss:.0f} MB RSS (limit {max_rss_mb} MB)")
+                return True
+        return False
 
     def navigate_to_reimpresion(self):
         try:
             # First try by ID and text content
-            reimpresion_button = self.wait.until(
+            reimpresion_button = self.wait_for('module',
                 EC.element_to_be_clickable((By.XPATH, "//button[@id='9' and contains(text(), 'Reimpresión cédula')]"))
             )
         except:
             try:
                 # Try by class and text content
-                reimpresion_button = self.wait.until(
+                reimpresion_button = self.wait_for('module',
                     EC.element_to_be_clickable(
                         (By.XPATH, "//button[@class='btn btn-light listaModulos' and contains(text(), 'Reimpresión cédula')]")
                     )
                 )
             except:
                 # Last resort - try just by ID
-                reimpresion_button = self.wait.until(
+                reimpresion_button = self.wait_for('module',
                     EC.element_to_be_clickable((By.ID, "9"))
                 )
         
         reimpresion_button.click()
 
-    async def send_telegram_message(self, message):
-        if self.telegram_token and self.telegram_chat_id:
-            bot = Bot(self.telegram_token)
-            await bot.send_message(chat_id=self.telegram_chat_id, text=message)
+    def notify(self, message, chat_id=None):
+        self.notifier.notify(message, chat_id)
+
+    def load_earliest(self, key='earliest'):
+        # The Slot the user was last notified about, or None
+        earliest = self.store.get_earliest(key)
+        if earliest is None and key == 'earliest':
+            earliest = self.import_state_file()
+        return earliest
 
-    def load_previous_state(self):
+    def import_state_file(self):
+        # One-off migration of the old appointment_state.json into the store
         try:
             with open(self.state_file, 'r') as f:
-                return json.load(f)
+                earliest = json.load(f).get('earliest')
         except FileNotFoundError:
-            return {}
+            return None
+        slot = None
+        if earliest:
+            slot = Slot.parse(earliest['office'], earliest['appointment'])
+            self.store.set_earliest(slot)
+        os.replace(self.state_file, self.state_file + '.imported')
+        self.logger.info(f"Imported {self.state_file} into {self.store.path}")
+        return slot
 
-    def save_state(self, state):
-        with open(self.state_file, 'w') as f:
-            json.dump(state, f)
+    def parse_slots(self, office, appointments):
+        # Card labels -> Slots, parsed once each
+        slots = []
+        for appointment in appointments:
+            try:
+                slots.append(Slot.parse(office, appointment))
+            except (ValueError, KeyError) as e:
+                self.logger.error(f"Error processing appointment data: {str(e)}")
+        return slots
 
     def parse_appointment_date(self, appointment_str):
-        # Parse "07 Abril 08:46" into datetime
-        day, month, time = appointment_str.split()
-        month_map = {
-            'Enero': 1, 'Febrero': 2, 'Marzo': 3, 'Abril': 4,
-            'Mayo': 5, 'Junio': 6, 'Julio': 7, 'Agosto': 8,
-            'Septiembre': 9, 'Octubre': 10, 'Noviembre': 11, 'Diciembre': 12
-        }
-        month_num = month_map[month]
-        hour, minute = map(int, time.split(':'))
-        year = datetime.now().year
-        return datetime(year, month_num, int(day), hour, minute)
+        # Parse "07 Abril 08:46" into datetime, in the next year if already past
+        return parse_label(appointment_str)
 
-    def check_appointment(self, region_id, offices, days_to_search=30):
-        self.logger.info(f"Starting appointment check for region {region_id}")
-        
-        # Load previous state at the start
-        previous_state = self.load_previous_state()
-        previous_earliest = None
-        cutoff_date = None  # Will be set if current appointment is still valid
-        
-        # First check if previous earliest appointment is still available
-        if 'earliest' in previous_state:
-            previous_appointment = previous_state['earliest']
-            previous_earliest = self.parse_appointment_date(previous_appointment['appointment'])
-            previous_office = previous_appointment['office']
-            
-            self.logger.info(f"Checking if previous appointment is still available: {previous_appointment['appointment']} at {previous_office}")
-            
-            # Select region from dropdown
-            region_dropdown = Select(self.wait.until(
-                EC.presence_of_element_located((By.ID, "selectRegion"))
-            ))
-            region_dropdown.select_by_value(region_id)
-            time.sleep(2)
-            
-            # Get office dropdown and select previous office
-            office_dropdown = Select(self.wait.until(
-                EC.presence_of_element_located((By.ID, "selectOficinas"))
-            ))
-            
-            try:
-                office_dropdown.select_by_visible_text(previous_office)
-                
-                # Parse the date from the previous appointment using our existing parse_appointment_date method
-                prev_date = self.parse_appointment_date(previous_appointment['appointment'])
-                formatted_date = prev_date.strftime("%d/%m/%Y")
-                
-                # Check that specific date
-                date_field = self.wait.until(
-                    EC.presence_of_element_located((By.ID, "idFechaSeleccionadaDesde"))
-                )
-                self.driver.execute_script("arguments[0].removeAttribute('readonly')", date_field)
-                date_field.clear()
-                date_field.send_keys(formatted_date)
-                
-                # Click search button
-                search_button = self.wait.until(
-                    EC.element_to_be_clickable((By.ID, "idBtnBuscarFechaDisponible"))
-                )
-                search_button.click()
-                
-                # Wait for loader
-                self.wait.until(
-                    EC.presence_of_element_located((By.ID, "idBuscarHoraLoaderContainer"))
-                )
-                self.wait.until(
-                    EC.invisibility_of_element_located((By.ID, "idBuscarHoraLoaderContainer"))
-                )
-                
-                # Check if the appointment is still there
-                appointments_container = self.wait.until(
-                    EC.presence_of_element_located((By.ID, "idHorasDisponiblesContainer"))
-                )
-                appointment_cards = appointments_container.find_elements(
-                    By.XPATH, ".//div[contains(@class, 'card') and not(contains(@style, 'display: none'))]"
-                )
-                
-                appointment_still_available = False
-                for card in appointment_cards:
-                    try:
-                        day = card.find_element(By.TAG_NAME, "h1").text
-                        month = card.find_element(By.TAG_NAME, "h5").text
-                        appointment_time = card.find_element(By.TAG_NAME, "h6").text
-                        if f"{day} {month} {appointment_time}" == previous_appointment['appointment']:
-                            appointment_still_available = True
-                            break
-                    except:
-                        continue
-                
-                if appointment_still_available:
-                    self.logger.info("Previous appointment is still available")
-                    # Set cutoff date to the current appointment date
-                    cutoff_date = previous_earliest
-                    
-                else:
-                    self.logger.info("Previous appointment is no longer available!")
-                    notification = (
-                        f"Previous appointment is no longer available!\n"
-                        f"Lost appointment: {previous_appointment['appointment']} at {previous_office}\n"
-                        f"Searching for new earlier appointment..."
-                    )
-                    asyncio.run(self.send_telegram_message(notification))
-                    previous_earliest = None  # Reset so we'll treat next found appointment as first
-                    self.save_state({})  # Clear the previous state
-            
-            except Exception as e:
-                self.logger.error(f"Error checking previous appointment: {str(e)}")
-                # Continue with regular search even if checking previous appointment fails
-        
-        # Continue with regular appointment search
-        # Select region again to ensure clean state
-        region_dropdown = Select(self.wait.until(
+    def wait_for(self, step, condition):
+        return WebDriverWait(self.driver, self.timeouts[step], poll_frequency=POLL_FREQUENCY).until(condition)
+
+    def select_region(self, region_id):
+        with METRICS.span('select_region'):
+            self._select_region(region_id)
+
+    def _select_region(self, region_id):
+        region_dropdown = Select(self.wait_for('page',
             EC.presence_of_element_located((By.ID, "selectRegion"))
         ))
+        if region_dropdown.first_selected_option.get_attribute('value') == region_id and \
+                self.driver.execute_script(OFFICES_READY_JS):
+            # Already on this region (persistent session), the office list is loaded
+            return
+
+        since = self.driver.execute_script(ARM_READINESS_JS)
         region_dropdown.select_by_value(region_id)
-        time.sleep(2)
-        
-        # Get office dropdown
-        office_dropdown = Select(self.wait.until(
-            EC.presence_of_element_located((By.ID, "selectOficinas"))
+        # Wait for the office list of this region to load
+        self.wait_for('offices', lambda driver: (
+            driver.execute_script(SETTLED_JS, since) and driver.execute_script(OFFICES_READY_JS)
         ))
-        
-        available_appointments = {}
-        earliest_appointment = None
-        earliest_office = None
-        
-        # Check each office
-        for office in offices:
+
+    def create_search_backend(self, region_id, workers=1):
+        backend = None
+        if self.search_backend == 'cdp':
+            # Reuse the tabs of the previous run unless the browser lost them
+            if self.cdp_backend and (not self.cdp_backend.alive or self.cdp_backend.tab_count != max(1, workers)):
+                self.close_cdp_backend()
+            if self.cdp_backend is None:
+                try:
+                    self.cdp_backend = CdpSearchBackend(self, tabs=workers)
+                except SessionExpiredError:
+                    raise
+                except Exception as e:
+                    self.logger.error(f"CDP search backend unavailable, falling back to Selenium: {str(e)}")
+            backend = self.cdp_backend
+        elif self.search_backend == 'http':
             try:
-                self.logger.info(f"Checking office: {office}")
-                office_dropdown.select_by_visible_text(office)
-                office_appointments = []
+                backend = HttpSearchBackend.from_driver(
+                    self.driver,
+                    self.search_endpoint,
+                    params_template=self.search_params,
+                    method=self.search_method
+                )
+            except Exception as e:
+                self.logger.error(f"HTTP search backend unavailable, falling back to Selenium: {str(e)}")
+        if backend is None:
+            backend = SeleniumSearchBackend(self)
+        try:
+            backend.prepare(region_id)
+        except Exception:
+            if backend is self.cdp_backend:
+                self.close_cdp_backend()
+            else:
+                backend.close()
+            raise
+        return backend
+
+    def close_cdp_backend(self):
+        if self.cdp_backend:
+            self.cdp_backend.close()
+            self.cdp_backend = None
+
+    def adopt_session(self, cookies):
+        # Reuse another browser's logged-in session instead of logging in again
+        self.driver.get(self.init_url)
+        self.driver.delete_all_cookies()
+        for cookie in cookies:
+            self.driver.add_cookie(cookie)
+        self.logged_in = True
+
+    def spawn_worker(self, index):
+        worker = AppointmentChecker(
+            self.run,
+            self.password,
+            debugging_port=self.debugging_port + index,
+            notifier=self.notifier,
+            store=self.store,
+            timeouts=self.timeouts,
+            base_url=self.base_url,
+            lean_profile=self.lean_profile,
+            cache_dir=self.cache_dir
+        )
+        try:
+            worker.adopt_session(self.driver.get_cookies())
+            worker.prepare_search_form()
+        except Exception:
+            worker.close()
+            raise
+        return worker
+
+    def create_worker_backends(self, region_id, backend, count):
+        # The HTTP client is thread safe and shared by every worker; the
+        # Selenium backend needs one extra browser per additional worker
+        if count <= 0 or backend.name != 'selenium':
+            return []
+
+        backends = []
+        for index in range(1, count + 1):
+            try:
+                if len(self.workers) < index:
+                    self.workers.append(self.spawn_worker(index))
+                worker = self.workers[index - 1]
+                if worker.is_session_expired() or not worker.driver.find_elements(By.ID, "selectRegion"):
+                    worker.adopt_session(self.driver.get_cookies())
+                    worker.prepare_search_form()
+                worker.select_region(region_id)
+                worker_backend = SeleniumSearchBackend(worker)
+                worker_backend.prepare(region_id)
+                backends.append(worker_backend)
+            except Exception as e:
+                self.logger.error(f"Could not start scan worker {index}: {str(e)}")
+                if len(self.workers) >= index:
+                    self.workers.pop(index - 1).close()
+                break
+        return backends
+
+    def run_searches(self, backends, items, threads):
+        # Searches every (office, date) item and yields the results on the
+        # calling thread, which does all the merging; stops with the session
+        # error once the site has logged us out
+        if backends[0].name == 'cdp':
+            results = backends[0].search_all(items)
+        else:
+            results = self.search_in_threads(backends, items, threads)
+
+        session_error = None
+        for result in results:
+            if isinstance(result[3], SessionExpiredError):
+                session_error = result[3]
+                continue
+            yield result
+        if session_error:
+            raise session_error
+
+    def search_in_threads(self, backends, items, threads):
+        # Workers take (office, date) items from a shared queue and hand their
+        # results back through another one
+        work = queue.Queue()
+        for item in items:
+            work.put(item)
+        results = queue.Queue()
+
+        def worker(backend):
+            while True:
+                try:
+                    office, date = work.get_nowait()
+                except queue.Empty:
+                    return
+                started = time.monotonic()
+                try:
+                    appointments = backend.search(office, date)
+                    observe_search(office, date, started, appointments)
+                    results.put((office, date, appointments, None))
+                except SessionExpiredError as e:
+                    observe_search(office, date, started, error=e)
+                    # No point searching further with an expired session
+                    while True:
+                        try:
+                            work.get_nowait()
+                        except queue.Empty:
+                            break
+                    results.put((office, date, None, e))
+                except Exception as e:
+                    observe_search(office, date, started, error=e)
+                    results.put((office, date, None, e))
+
+        pool = [
+            threading.Thread(target=worker, args=(backends[index % len(backends)],), daemon=True)
+            for index in range(max(1, threads))
+        ]
+        for thread in pool:
+            thread.start()
+
+        pending = len(items)
+        while pending:
+            try:
+                result = results.get(timeout=1)
+            except queue.Empty:
+                if not any(thread.is_alive() for thread in pool) and results.empty():
+                    break
+                continue
+            pending -= 1
+            yield result
+
+        for thread in pool:
+            thread.join()
+
+    def next_search_date(self, check_date, slots, resolved=False):
+        # The date field is a "from" date: a search returns the cards from
+        # check_date onwards, possibly spanning several days. Returns the
+        # next date worth searching, or None when this office is done.
+        if not slots:
+            if self.desde_search:
+                # An empty result range: nothing from check_date on
+                return None
+            # Only an empty day, until we have seen a response span several days
+            return check_date + timedelta(days=1)
+
+        last_date = max(slots).at.date()
+        if last_date > check_date and not self.desde_search:
+            self.logger.info("Search results span several days, skipping days already covered")
+            self.desde_search = True
+
+        if resolved:
+            # The first card is already this office's earliest slot from check_date
+            return None
+        if last_date > check_date:
+            # The last day may have been cut off, so search again from it
+            return last_date
+        return check_date + timedelta(days=1)
+
+    def search_range(self, check_date, slots, last_day):
+        # The part of the calendar one search from check_date showed: up to
+        # its last card (any later ones may be cut off), or when it found
+        # nothing the whole day, or everything up to last_day for an empty
+        # "from" search
+        start = datetime.combine(check_date, datetime.min.time())
+        if slots:
+            return start, max(slots).at
+        end_day = max(last_day, check_date) if self.desde_search else check_date
+        return start, datetime.combine(end_day, datetime.max.time())
+
+    def diff_search(self, office, search_range, slots, expected=()):
+        # Compares one search with what we believed was in the part of the
+        # calendar it showed (search_range, from search_range()): the office's
+        # snapshot from earlier runs (already updated by this run's earlier
+        # searches) and the appointments in expected (the ones subscribers
+        # were told about). The result then replaces that part of the snapshot.
+        start, end = (to_timestamp(moment) for moment in search_range)
+        scan = self.scans.setdefault(office, OfficeScan())
+        before = scan.within(start, end)
+        before.update(slot for slot in expected
+                      if slot is not None and slot.office == office and start <= slot.timestamp <= end)
+        diff = diff_slots(before, slots)
+        scan.replace(start, end, slots)
+        if diff.added or diff.removed:
+            self.logger.debug(f"{office}: {len(diff.added)} new and {len(diff.removed)} taken slots since the last check",
+                              extra={'office': office, 'date': search_range[0].date()})
+        return diff
+
+    def report_lost(self, diff, subscribers, earliest, unset):
+        # Tells the subscribers whose appointment is among the slots gone, and
+        # adds them to unset (the names without an appointment this run)
+        removed = set(diff.removed)
+        for subscriber in subscribers:
+            previous = earliest[subscriber.name]
+            if previous is None or previous not in removed:
+                continue
+            self.logger.info(f"{subscriber.log_prefix}Previous appointment is no longer available!")
+            notification = (
+                f"Previous appointment is no longer available!\n"
+                f"Lost appointment: {previous}\n"
+                f"Searching for new earlier appointment..."
+            )
+            self.notify(notification, subscriber.chat_id)
+            earliest[subscriber.name] = None  # Reset so we'll treat next found appointment as first
+            unset.add(subscriber.name)
+            self.store.clear_earliest(subscriber.state_key)
+
+    def check_appointment(self, region_id, offices, days_to_search=30, workers=1, scan_mode='earliest',
+                          scheduler=None, breaker=None):
+        # A single subscriber with the settings from .env
+        subscriber = Subscriber(None, region_id, offices, days_to_search)
+        return self.check_subscribers(region_id, [subscriber], workers=workers, scan_mode=scan_mode,
+                                      scheduler=scheduler, breaker=breaker)
+
+    def check_subscribers(self, region_id, subscribers, workers=1, scan_mode='earliest', scheduler=None,
+                          breaker=None):
+        # Searches every office any of the subscribers watch once, and hands
+        # each result to the subscribers interested in that office
+        self.logger.info(f"Starting appointment check for region {region_id}")
+        # Without a long-lived breaker, still stop searching a failing office for this run
+        breaker = breaker or CircuitBreaker()
+        
+        # The appointment each subscriber was last notified about
+        earliest = {subscriber.name: self.load_earliest(subscriber.state_key) for subscriber in subscribers}
+        # Subscribers that had no appointment at some point this run: any slot
+        # found can be their best one, not just those new since the last run
+        unset = {name for name, slot in earliest.items() if slot is None}
+        added = {}  # Office -> slots new since the last run, rechecks included
+        first_day = datetime.now().date()
+        window_ends = {
+            subscriber.name: first_day + timedelta(days=subscriber.days_to_search - 1) for subscriber in subscribers
+        }
+        # Shortened while a subscriber's current appointment is still valid, in
+        # earliest mode only; a full scan reports the whole window
+        last_days = dict(window_ends)
+
+        self.select_region(region_id)
+        backend = self.create_search_backend(region_id, workers)
+        backends = [backend] + self.create_worker_backends(region_id, backend, workers - 1)
+        self.logger.info(f"Using {backend.name} search backend with {workers} worker(s)")
+
+        try:
+            # Forget slots on days that have passed since the last run
+            today_start = to_timestamp(datetime.combine(first_day, datetime.min.time()))
+            for scan in self.scans.values():
+                scan.drop_before(today_start)
+
+            # First check if previous earliest appointments are still available
+            rechecked = set()  # (office, date) already searched, so shared appointments are searched once
+            for subscriber in subscribers:
+                previous = earliest[subscriber.name]
+                if not previous:
+                    continue
+                self.logger.info(f"{subscriber.log_prefix}Checking if previous appointment is still available: {previous}")
                 
-                # Check next X days, but only up to cutoff_date if it exists
-                current_date = datetime.now()
-                for i in range(days_to_search):
-                    check_date = current_date + timedelta(days=i)
-                    
-                    # Skip dates after the cutoff date if it exists
-                    if cutoff_date and check_date.date() > cutoff_date.date():
-                        self.logger.info(f"Skipping remaining dates for {office} as they are after current appointment")
-                        break
+                try:
+                    # Check the specific date of the previous appointment
+                    recheck = (previous.office, previous.at.date())
+                    if recheck not in rechecked:
+                        rechecked.add(recheck)
+                        found = self.parse_slots(previous.office, backend.search(previous.office, previous.at))
+                        searched = self.search_range(previous.at.date(), found, max(window_ends.values()))
+                        diff = self.diff_search(previous.office, searched, found, earliest.values())
+                        added.setdefault(previous.office, set()).update(diff.added)
+                        self.report_lost(diff, subscribers, earliest, unset)
+                        # Not from the first day on, so no coverage to extend
+                        scan = self.scans[previous.office]
+                        self.store.record_search(found, released=[slot for slot in diff.added if scan.covers(slot)])
                     
-                    formatted_date = check_date.strftime("%d/%m/%Y")
-                    
-                    try:
-                        # Find and update date field
-                        date_field = self.wait.until(
-                            EC.presence_of_element_located((By.ID, "idFechaSeleccionadaDesde"))
-                        )
-                        self.driver.execute_script("arguments[0].removeAttribute('readonly')", date_field)
-                        date_field.clear()
-                        date_field.send_keys(formatted_date)
-                        
-                        # Click search button
-                        search_button = self.wait.until(
-                            EC.element_to_be_clickable((By.ID, "idBtnBuscarFechaDisponible"))
-                        )
-                        search_button.click()
+                    if earliest[subscriber.name] == previous:
+                        self.logger.info(f"{subscriber.log_prefix}Previous appointment is still available")
+                        # Nothing after the current appointment is worth searching for
+                        if scan_mode == 'earliest' and previous.at.date() < last_days[subscriber.name]:
+                            self.logger.info(f"{subscriber.log_prefix}Skipping dates after the current appointment")
+                            last_days[subscriber.name] = previous.at.date()
+                
+                except SessionExpiredError:
+                    raise
+                except Exception as e:
+                    self.logger.error(f"{subscriber.log_prefix}Error checking previous appointment: {str(e)}")
+                    # Continue with regular search even if checking previous appointment fails
 
-                        # Wait for loader to appear and disappear
-                        self.wait.until(
-                            EC.presence_of_element_located((By.ID, "idBuscarHoraLoaderContainer"))
-                        )
-                        self.wait.until(
-                            EC.invisibility_of_element_located((By.ID, "idBuscarHoraLoaderContainer"))
-                        )
+            # Drop offices that are not offered before queueing their dates
+            watchers = {}  # office -> subscribers watching it
+            for subscriber in subscribers:
+                for office in subscriber.offices:
+                    watchers.setdefault(office, []).append(subscriber)
+            office_slots = {}
+            failed_offices = {}  # office -> last error, for the snapshot
+            for office in watchers:
+                if not breaker.allows(office):
+                    self.logger.info(f"Skipping office {office} after repeated failures")
+                    continue
+                try:
+                    self.logger.info(f"Checking office: {office}")
+                    backend.select_office(office)
+                    office_slots[office] = set()
+                except SessionExpiredError:
+                    raise
+                except Exception as e:
+                    kind = classify_error(e)
+                    error_msg = f"Error checking office {office} ({kind}): {str(e)}"
+                    self.logger.error(error_msg, extra={'office': office, 'phase': 'select_office'})
+                    failed_offices[office] = str(e)
+                    breaker.record_failure(office, kind)
+            if len(subscribers) > 1:
+                self.logger.info(f"Scanning {len(office_slots)} distinct offices for {len(subscribers)} subscribers")
 
-                        # Check for available appointments more efficiently
-                        appointments_container = self.wait.until(
-                            EC.presence_of_element_located((By.ID, "idHorasDisponiblesContainer"))
-                        )
+            # Each office keeps a cursor with the next "from" date to search, up
+            # to the furthest day any subscriber watching it still cares about
+            office_last_days = {
+                office: max(last_days[subscriber.name] for subscriber in watchers[office]) for office in office_slots
+            }
+            # The whole window each office is searched for, whatever shortens the scan
+            office_windows = {
+                office: max(window_ends[subscriber.name] for subscriber in watchers[office]) for office in office_slots
+            }
+            searched_through = {}  # Office -> how far its searches reached from today, while none failed
+            cursors = {office: first_day for office in office_slots}
+            searches = {office: 0 for office in office_slots}
+            cycle_earliest = {}  # Subscriber name -> earliest slot found in their window this run
+            probe_results = None  # First round results when the probe scheduler is on
+            skipped_offices = set()
 
-                        # Get all card data at once using a single JavaScript execution
-                        cards_data = self.driver.execute_script("""
-                            const cards = document.querySelectorAll('#idHorasDisponiblesContainer .card:not([style*="display: none"])');
-                            return Array.from(cards).map(card => ({
-                                day: card.querySelector('h1').textContent,
-                                month: card.querySelector('h5').textContent,
-                                time: card.querySelector('h6').textContent
-                            }));
-                        """)
-
-                        for card_data in cards_data:
-                            try:
-                                appointment_str = f"{card_data['day']} {card_data['month']} {card_data['time']}"
-                                
-                                # Check if this appointment is earlier than our previous earliest
-                                current_date = self.parse_appointment_date(appointment_str)
-                                if previous_earliest and current_date < previous_earliest:
-                                    notification = (
-                                        f"New earlier appointment found!\n"
-                                        f"Previous: {previous_state['earliest']['appointment']} at {previous_state['earliest']['office']}\n"
-                                        f"New: {appointment_str} at {office}"
-                                    )
-                                    self.logger.info(f"New earlier appointment found: {appointment_str} at {office}")
-                                    asyncio.run(self.send_telegram_message(notification))
-                                    
-                                    # Update state immediately
-                                    self.save_state({
-                                        'earliest': {
-                                            'appointment': appointment_str,
-                                            'office': office
-                                        }
-                                    })
-                                    # Update previous_earliest for subsequent comparisons
-                                    previous_earliest = current_date
-                                elif not previous_earliest:  # First appointment ever found
-                                    notification = (
-                                        f"First appointment found!\n"
-                                        f"Date: {appointment_str} at {office}"
-                                    )
-                                    self.logger.info("First appointment found")
-                                    asyncio.run(self.send_telegram_message(notification))
-                                    
-                                    # Save initial state
-                                    self.save_state({
-                                        'earliest': {
-                                            'appointment': appointment_str,
-                                            'office': office
-                                        }
-                                    })
-                                    previous_earliest = current_date
-                                    
-                                office_appointments.append(appointment_str)
-                            except Exception as e:
-                                self.logger.error(f"Error processing appointment data: {str(e)}")
+            threads = workers if backend.name == 'http' else len(backends)
+            while cursors:
+                if scan_mode == 'earliest':
+                    # Date-major: every office at the earliest pending day first
+                    day = min(cursors.values())
+                    round_items = [(office, day) for office, cursor in cursors.items() if cursor == day]
+                else:
+                    # Full inventory: every office advances on its own
+                    round_items = list(cursors.items())
+
+                round_results = {}
+                for office, check_date, found_appointments, error in self.run_searches(backends, round_items, threads):
+                    searches[office] += 1
+                    if error:
+                        kind = classify_error(error)
+                        error_msg = f"Error checking date {check_date.strftime('%d/%m/%Y')} for office {office} ({kind}): {str(error)}"
+                        self.logger.error(error_msg, extra={'office': office, 'date': check_date, 'phase': 'search'})
+                        failed_offices[office] = str(error)
+                        next_date = check_date + timedelta(days=1)
+                        cooldown = breaker.record_failure(office, kind)
+                        if cooldown:
+                            # Fail fast instead of burning a timeout on every remaining date
+                            self.logger.warning(f"Too many failures for office {office}, skipping it for {cooldown:.0f}s")
+                            next_date = None
+                    else:
+                        breaker.record_success(office)
+                        round_results[office] = found_appointments
+                        found = self.parse_slots(office, found_appointments)
+                        next_date = self.next_search_date(check_date, found, resolved=scan_mode == 'earliest')
+                        office_slots[office].update(found)
+
+                        # What changed at this office since the last run: lost
+                        # appointments, then for each subscriber watching it
+                        # whether a new slot beats their earliest so far
+                        searched = self.search_range(check_date, found, office_last_days[office])
+                        diff = self.diff_search(office, searched, found, earliest.values())
+                        added.setdefault(office, set()).update(diff.added)
+                        self.report_lost(diff, watchers[office], earliest, unset)
+                        changed = {}
+                        for subscriber in watchers[office]:
+                            window_end = window_ends[subscriber.name]
+                            in_window = [slot for slot in found if slot.at.date() <= window_end]
+                            if in_window:
+                                first_found = min(in_window)
+                                if subscriber.name not in cycle_earliest or first_found < cycle_earliest[subscriber.name]:
+                                    cycle_earliest[subscriber.name] = first_found
+                            previous = earliest[subscriber.name]
+                            # Only a slot that appeared since the last run can beat an
+                            # appointment that was still the earliest one known
+                            if subscriber.name not in unset:
+                                in_window = [slot for slot in in_window if slot in added[office]]
+                            if not in_window or (previous is not None and not min(in_window) < previous):
                                 continue
-                
-                    except Exception as e:
-                        error_msg = f"Error checking date {formatted_date} for office {office}: {str(e)}"
-                        self.logger.error(error_msg)
-                        print(error_msg)
-                        continue
-
-                if office_appointments:
-                    self.logger.info(f"Found {len(office_appointments)} appointments for {office}")
-                    # Sort appointments by date
-                    sorted_appointments = sorted(
-                        office_appointments,
-                        key=lambda x: self.parse_appointment_date(x)
-                    )
-                    available_appointments[office] = sorted_appointments
-                    
-                    if earliest_appointment is None or self.parse_appointment_date(sorted_appointments[0]) < self.parse_appointment_date(earliest_appointment):
-                        earliest_appointment = sorted_appointments[0]
-                        earliest_office = office
+                            best = min(in_window)
+                            if previous:
+                                self.logger.info(f"{subscriber.log_prefix}New earlier appointment found: {best}")
+                                self.notifier.notify_slot(best.label, best.office, previous=str(previous),
+                                                          chat_id=subscriber.chat_id, subscriber=subscriber.state_key)
+                            else:
+                                self.logger.info(f"{subscriber.log_prefix}First appointment found")
+                                self.notifier.notify_slot(best.label, best.office,
+                                                          chat_id=subscriber.chat_id, subscriber=subscriber.state_key)
+                            earliest[subscriber.name] = best
+                            changed[subscriber.state_key] = best
+                        # Each office's searches pick up where the last one stopped,
+                        # so until one fails they cover the calendar from today
+                        # on; a slot new inside what earlier searches covered was released
+                        scan = self.scans[office]
+                        released = [slot for slot in diff.added if scan.covers(slot)]
+                        if office not in failed_offices:
+                            scan.extend(to_timestamp(searched[1]))
+                            searched_through[office] = searched[1]
+                        # All slots from this search and the new earliest ones in one transaction
+                        self.store.record_search(found, earliest=changed, released=released)
 
-                print(f"Checked {office} for next {days_to_search} days")
+                    if next_date is None or next_date > office_last_days[office]:
+                        del cursors[office]
+                    else:
+                        cursors[office] = next_date
 
-            except Exception as e:
-                error_msg = f"Error checking office {office}: {str(e)}"
-                self.logger.error(error_msg)
-                print(error_msg)
-                continue
+                if scheduler and probe_results is None:
+                    # The first round (one search per office from today) is the
+                    # probe; only offices whose fingerprint changed get a deep scan
+                    probe_results = round_results
+                    for office in list(cursors):
+                        if office in probe_results and not scheduler.needs_deep_scan(office, probe_results[office]):
+                            del cursors[office]
+                            skipped_offices.add(office)
+
+                if scan_mode == 'earliest' and cycle_earliest:
+                    # Nothing searched from a later day can be earlier than what
+                    # every subscriber watching the office already has
+                    for office in list(cursors):
+                        if all(subscriber.name in cycle_earliest and
+                               cursors[office] > cycle_earliest[subscriber.name].at.date()
+                               for subscriber in watchers[office]):
+                            del cursors[office]
+
+            if scheduler and probe_results is not None:
+                for office in office_slots:
+                    if office in skipped_offices:
+                        # Unchanged since the last deep scan, reuse what it found
+                        office_slots[office].update(scheduler.inventory.get(office, []))
+                        searched_through[office] = datetime.combine(office_windows[office], datetime.max.time())
+                    elif office in probe_results and office not in failed_offices:
+                        # A deep scan cut short by errors (or the breaker) is not an
+                        # inventory to reuse; the next run scans the office again
+                        scheduler.record_deep_scan(office, probe_results[office], office_slots[office])
+                self.logger.info(
+                    f"Deep scanned {len(office_slots) - len(skipped_offices)} of {len(office_slots)} offices"
+                )
+        finally:
+            for search_backend in backends:
+                if search_backend is not self.cdp_backend:
+                    search_backend.close()
+
+        if self.snapshot:
+            self.snapshot.update(region_id, office_slots, failed_offices, searched_through, office_windows)
+
+        available_appointments = {}
+        for office, slots in office_slots.items():
+            if slots:
+                self.logger.info(f"Found {len(slots)} appointments for {office}")
+                # Sort appointments by date
+                available_appointments[office] = [slot.label for slot in sorted(slots)]
+            self.logger.info(f"Checked {office} with {searches[office]} searches",
+                             extra={'office': office, 'phase': 'scan'})
 
         return available_appointments
 
     def close(self):
-        self.driver.quit()
+        self.close_cdp_backend()
+        for worker in self.workers:
+            worker.close()
+        self.workers = []
+        if self.owns_notifier:
+            self.notifier.close()
+        if self.owns_store:
+            self.store.close()
+        if self.driver:
+            self.driver.quit()
         # Clean up the temporary directory
         try:
             import shutil
@@ -412,7 +1491,6 @@ class AppointmentChecker:
 def signal_handler(signum, frame):
     logger = logging.getLogger(__name__)
     logger.info("Received shutdown signal, exiting gracefully")
-    print("\nShutting down gracefully...")
     sys.exit(0)
 
 def main():
@@ -420,47 +1498,127 @@ def main():
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     
+    # Load environment variables (the logging settings too)
+    load_dotenv()
+    
     # Setup logging
     logger = setup_logging()
     logger.info("Starting appointment checker")
     
-    # Load environment variables
-    load_dotenv()
-    
     # Get credentials from environment variables
     run = os.getenv('RUN')
     password = os.getenv('PASSWORD')
     region_id = os.getenv('REGION')
-    offices = os.getenv('OFFICES').split(',')
+    offices = os.getenv('OFFICES')
     telegram_token = os.getenv('TELEGRAM_BOT_TOKEN')
     telegram_chat_id = os.getenv('TELEGRAM_CHAT_ID')
     days_to_search = int(os.getenv('DAYS_TO_SEARCH', '30'))
     wait_time = int(os.getenv('WAIT_TIME', '60'))  # Default to 60 seconds if not set
     
-    if not all([run, password, region_id, offices]):
-        logger.error("Missing required environment variables")
-        print("Error: RUN, PASSWORD, REGION, and OFFICES must be set in .env file")
+    # Several people can share one daemon and one login: every distinct
+    # office is searched once and the results go to whoever watches it
+    subscribers_file = os.getenv('SUBSCRIBERS_FILE')
+    if subscribers_file:
+        if not all([run, password]):
+            logger.error("Missing required environment variables: RUN and PASSWORD must be set in .env file")
+            return
+        subscribers = load_subscribers(subscribers_file, days_to_search)
+        logger.info(f"Loaded {len(subscribers)} subscribers from {subscribers_file}")
+    elif not all([run, password, region_id, offices]):
+        logger.error("Missing required environment variables: RUN, PASSWORD, REGION, and OFFICES must be set in .env file")
         return
+    else:
+        subscribers = [Subscriber(None, region_id, offices.split(','), days_to_search, telegram_chat_id)]
 
-    while True:
-        checker = None
-        try:
-            checker = AppointmentChecker(
-                run, 
-                password,
-                telegram_token=telegram_token,
-                telegram_chat_id=telegram_chat_id
-            )
-            
-            logger.info("Attempting login")
-            checker.login()
+    # Keep one browser alive across runs instead of relaunching it every time
+    persistent_session = env_flag('PERSISTENT_SESSION')
+    max_session_rss_mb = int(os.getenv('MAX_SESSION_RSS_MB', '1024'))
+    max_session_age = int(os.getenv('MAX_SESSION_AGE', '21600'))
+
+    # Optional direct HTTP search; Selenium is still used to log in
+    search_backend = os.getenv('SEARCH_BACKEND', 'selenium').lower()
+    search_endpoint = os.getenv('SEARCH_ENDPOINT')
+    search_params = os.getenv('SEARCH_PARAMS', DEFAULT_SEARCH_PARAMS)
+    search_method = os.getenv('SEARCH_METHOD', 'POST')
+    timeouts = parse_timeouts(os.getenv('TIMEOUTS'))
+    base_url = os.getenv('SRCEI_BASE_URL', DEFAULT_BASE_URL)
+    scan_workers = max(1, int(os.getenv('SCAN_WORKERS', '1')))
+    scan_mode = os.getenv('SCAN_MODE', 'earliest').lower()
+
+    # Lean browser: no images, fonts, media or trackers, and a cache kept across runs
+    lean_profile = None
+    if env_flag('LEAN_BROWSER'):
+        lean_profile = {
+            'block_types': parse_list(os.getenv('BLOCK_RESOURCE_TYPES'), DEFAULT_BLOCKED_TYPES),
+            'block_urls': parse_list(os.getenv('BLOCK_URLS'), DEFAULT_BLOCKED_URLS),
+            'allow_domains': parse_list(os.getenv('ALLOW_DOMAINS'))
+        }
+    cache_dir = os.getenv('BROWSER_CACHE_DIR', 'browser-cache' if lean_profile else None)
+
+    # Probe every office each run, deep scan only the ones that changed
+    scheduler = None
+    if env_flag('PROBE_SCHEDULER'):
+        scheduler = ProbeScheduler(int(os.getenv('DEEP_SCAN_INTERVAL', '900')))
+
+    # Skip offices that keep failing, and slow down while the site is struggling
+    breaker = CircuitBreaker(
+        int(os.getenv('BREAKER_THRESHOLD', '3')),
+        int(os.getenv('BREAKER_COOLDOWN', '600'))
+    )
+    max_backoff = int(os.getenv('MAX_BACKOFF', '1800'))
+    degraded_runs = 0
+
+    # Optional Prometheus-style endpoint with per-phase timings
+    metrics_port = int(os.getenv('METRICS_PORT', '0'))
+    if metrics_port:
+        start_metrics_server(metrics_port)
+        logger.info(f"Serving metrics on http://127.0.0.1:{metrics_port}/metrics")
+
+    # The latest results per office, optionally served as JSON for other tools
+    snapshot = AvailabilitySnapshot(int(os.getenv('API_STALE_AFTER', str(max(3 * wait_time, 600)))))
+    api_port = int(os.getenv('API_PORT', '0'))
+    if api_port:
+        start_availability_server(snapshot, api_port)
+        logger.info(f"Serving availability on http://127.0.0.1:{api_port}/availability")
+
+    # One background notifier for the whole process, so sends never block a scan
+    notifier = TelegramNotifier(
+        telegram_token,
+        telegram_chat_id,
+        coalesce_window=float(os.getenv('NOTIFY_COALESCE_SECONDS', '5'))
+    )
+
+    # Slot history and the last notified appointment, kept across runs
+    store = SlotStore(os.getenv('STATE_DB', 'appointment_state.db'))
+
+    # Poll more often at the hours new slots usually show up, less at the others
+    poller = None
+    if env_flag('ADAPTIVE_POLLING'):
+        poller = AdaptivePoller(
+            store,
+            base_interval=wait_time,
+            min_interval=int(os.getenv('POLL_MIN_INTERVAL', '20')),
+            max_interval=int(os.getenv('POLL_MAX_INTERVAL', '600')),
+            budget=int(os.getenv('POLL_BUDGET', '0')),
+            history_days=int(os.getenv('POLL_HISTORY_DAYS', '14'))
+        )
+    watched_offices = list(dict.fromkeys(office for subscriber in subscribers for office in subscriber.offices))
+
+    def scan_all(checker):
+        logger.info("Preparing search form")
+        if checker.prepare_search_form():
             logger.info("Login successful")
-            
-            checker.navigate_to_reimpresion()
             logger.info("Navigated to reimpresion page")
+        else:
+            logger.info("Reusing existing browser session")
 
-            logger.info(f"Checking availability for region {region_id} for the next {days_to_search} days")
-            available_appointments = checker.check_appointment(region_id, offices, days_to_search)
+        for region, region_subscribers in group_by_region(subscribers).items():
+            days = max(subscriber.days_to_search for subscriber in region_subscribers)
+            logger.info(f"Checking availability for region {region} for the next {days} days")
+            with METRICS.span('scan'):
+                available_appointments = checker.check_subscribers(region, region_subscribers,
+                                                                   workers=scan_workers, scan_mode=scan_mode,
+                                                                   scheduler=scheduler, breaker=breaker)
             
             if available_appointments:
                 logger.info("Available appointments found")
@@ -469,21 +1627,96 @@ def main():
             else:
                 logger.info("No available appointments found")
 
-        except Exception as e:
-            error_msg = f"An error occurred: {str(e)}"
-            logger.error(error_msg)
-            print(error_msg)
-            if checker:
-                asyncio.run(checker.send_telegram_message(f"Error en el checker: {str(e)}"))
-        finally:
-            if checker:
-                logger.info("Closing current checker instance")
-                checker.close()
-            
-            # Wait before starting the next run
-            logger.info(f"Waiting {wait_time} seconds before next run")
-            time.sleep(wait_time)
-            logger.info("Starting new run")
+    # Per-office slot snapshots, kept across browser recycles like the store
+    scans = {}
+    checker = None
+    try:
+        while True:
+            cycle = METRICS.start_cycle()
+            degraded = False
+            try:
+                if checker and checker.needs_recycle(max_session_rss_mb, max_session_age):
+                    logger.info("Recycling browser session")
+                    checker.close()
+                    checker = None
+
+                if checker is None:
+                    with METRICS.span('startup'):
+                        checker = AppointmentChecker(
+                            run, 
+                            password,
+                            telegram_token=telegram_token,
+                            telegram_chat_id=telegram_chat_id,
+                            search_backend=search_backend,
+                            search_endpoint=search_endpoint,
+                            search_params=search_params,
+                            search_method=search_method,
+                            timeouts=timeouts,
+                            base_url=base_url,
+                            notifier=notifier,
+                            store=store,
+                            lean_profile=lean_profile,
+                            cache_dir=cache_dir,
+                            snapshot=snapshot,
+                            scans=scans
+                        )
+
+                try:
+                    scan_all(checker)
+                except SessionExpiredError:
+                    # The kept session expired on the server while idle: log
+                    # in again in the same browser and run once more, no alert
+                    logger.info("Session expired, logging in again")
+                    checker.logged_in = False
+                    scan_all(checker)
+
+            except Exception as e:
+                kind = classify_error(e)
+                if kind == 'session':
+                    # Logging in again did not help, start over with a new browser
+                    error_msg = f"Session expired again after logging in ({kind}): {str(e)}"
+                else:
+                    error_msg = f"An error occurred ({kind}): {str(e)}"
+                logger.error(error_msg)
+                # Timeouts and network errors back off; missing offices are
+                # left to the circuit breaker inside the run
+                degraded = kind in ('timeout', 'network')
+                if checker:
+                    notifier.notify(f"Error en el checker: {str(e)}")
+                    # Never reuse a session that just failed
+                    logger.info("Closing current checker instance")
+                    checker.close()
+                    checker = None
+            finally:
+                if checker and not persistent_session:
+                    logger.info("Closing current checker instance")
+                    checker.close()
+                    checker = None
+
+                logger.info(METRICS.end_cycle())
+
+                # Back off exponentially while the site times out or is unreachable
+                if cycle.searches and cycle.timeouts * 2 >= cycle.searches:
+                    degraded = True
+                degraded_runs = degraded_runs + 1 if degraded else 0
+                interval = wait_time
+                if poller:
+                    poller.record_run(cycle.searches)
+                    interval = poller.next_interval(watched_offices)
+                # The exponent is capped so a long outage cannot overflow a float interval
+                delay = min(interval * 2 ** min(degraded_runs, 16), max(max_backoff, interval))
+                if degraded_runs:
+                    logger.warning(f"Site looks degraded ({degraded_runs} runs in a row), backing off")
+                
+                # Wait before starting the next run
+                logger.info(f"Waiting {delay:.0f} seconds before next run")
+                time.sleep(delay)
+                logger.info("Starting new run")
+    finally:
+        if checker:
+            checker.close()
+        notifier.close()
+        store.close()
 
 if __name__ == "__main__":
     main() 
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The latest slots found at every office, kept in memory between runs and
+# optionally served read-only as JSON, so dashboards and scripts can ask the
+# daemon instead of scraping the site themselves. Each office remembers when
+# it was last searched successfully; past stale_after seconds it is flagged
+# as stale (failing, skipped by the circuit breaker, or the daemon is stuck).
+# A run that stopped short of an office's search window (earliest mode, or
+# nothing after a subscriber's current appointment) only replaces the slots
+# up to where it searched, and the entry is flagged as partial.
+
+def isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat(timespec='seconds')
+
+class AvailabilitySnapshot:
+    def __init__(self, stale_after=600):
+        self.stale_after = stale_after
+        self.offices = {}  # office -> {'region', 'slots', 'checked_at', 'searched_through', 'partial', 'error'}
+        self.updated_at = None
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def _entry(self, office, region_id):
+        entry = self.offices.setdefault(office, {'slots': [], 'checked_at': None, 'searched_through': None,
+                                                 'partial': False, 'error': None})
+        entry['region'] = str(region_id)
+        return entry
+
+    def update(self, region_id, office_slots, failed=None, searched_through=None, window_ends=None,
+               checked_at=None):
+        # office_slots: office -> Slots found this run. searched_through:
+        # office -> datetime this run's searches reached from today without a
+        # gap (all of them complete when not given; offices missing from it
+        # were not searched); slots past it are kept from earlier runs, and
+        # the entry is partial if that is before the office's window_ends
+        # date. failed: office -> error message for offices whose results are
+        # incomplete; those keep the slots and check time of their last
+        # successful scan.
+        checked_at = checked_at or time.time()
+        failed = failed or {}
+        window_ends = window_ends or {}
+        with self.lock:
+            for office, slots in office_slots.items():
+                if office in failed or (searched_through is not None and office not in searched_through):
+                    continue
+                entry = self._entry(office, region_id)
+                through = searched_through[office] if searched_through is not None else None
+                slots = set(slots)
+                if through is not None:
+                    slots.update(slot for slot in entry['slots'] if slot.at > through)
+                partial = through is not None and office in window_ends and through.date() < window_ends[office]
+                entry.update(slots=sorted(slots), checked_at=checked_at, searched_through=through,
+                             partial=partial, error=None)
+            for office, error in failed.items():
+                self._entry(office, region_id)['error'] = error
+            self.updated_at = checked_at
+            self.version += 1
+
+    def as_dict(self, now=None):
+        now = now or time.time()
+        with self.lock:
+            offices = {}
+            earliest = None
+            for office, entry in sorted(self.offices.items()):
+                checked_at = entry['checked_at']
+                through = entry['searched_through']
+                age = now - checked_at if checked_at else None
+                offices[office] = {
+                    'region': entry['region'],
+                    'count': len(entry['slots']),
+                    'earliest': entry['slots'][0].label if entry['slots'] else None,
+                    'slots': [{'label': slot.label, 'at': slot.at.isoformat(timespec='minutes')}
+                              for slot in entry['slots']],
+                    'checked_at': isoformat(checked_at) if checked_at else None,
+                    'age_seconds': round(age) if age is not None else None,
+                    'stale': age is None or age > self.stale_after,
+                    'searched_through': through.isoformat(timespec='minutes') if through else None,
+                    'partial': entry['partial'],
+                    'error': entry['error']
+                }
+                if entry['slots'] and (earliest is None or entry['slots'][0] < earliest):
+                    earliest = entry['slots'][0]
+            age = now - self.updated_at if self.updated_at else None
+            return {
+                'updated_at': isoformat(self.updated_at) if self.updated_at else None,
+                'age_seconds': round(age) if age is not None else None,
+                'stale': age is None or age > self.stale_after,
+                'earliest': {
+                    'office': earliest.office,
+                    'label': earliest.label,
+                    'at': earliest.at.isoformat(timespec='minutes')
+                } if earliest else None,
+                'offices': offices
+            }
+
+    def etag(self):
+        # Changes with every update; the ages in the body move on regardless,
+        # hence a weak validator
+        with self.lock:
+            digest = hashlib.sha1(f'{self.updated_at}:{self.version}'.encode('ascii')).hexdigest()[:16]
+        return f'W/"{digest}"'
+
+class AvailabilityRequestHandler(BaseHTTPRequestHandler):
+    snapshot = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/availability'):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        etag = self.snapshot.etag()
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        body = json.dumps(self.snapshot.as_dict(), ensure_ascii=False).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_availability_server(snapshot, port, host='127.0.0.1'):
+    handler = type('SnapshotRequestHandler', (AvailabilityRequestHandler,), {'snapshot': snapshot})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
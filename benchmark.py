@@ -0,0 +1,169 @@
+import argparse
+import itertools
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import mock_srcei
+from appointment_checker import (DEFAULT_BLOCKED_TYPES, DEFAULT_BLOCKED_URLS, AppointmentChecker,
+                                 HttpSearchBackend, ProbeScheduler)
+from notifier import RecordingNotifier
+from slot_store import SlotStore
+
+# Runs the scan engine against the offline mock site and reports cycle time,
+# searches per second and time-to-first-slot for each combination of scan
+# strategy, office count and day window.
+#
+#   python3 benchmark.py --modes earliest,full --offices 1,3,6 --days 7,30
+#
+# The default "direct" backend drives check_appointment over HTTP without a
+# browser. "selenium" and "http" start Chromium against the mock site the
+# same way main() does, so they need chromium and ./chromedriver.
+
+REGION = '13'
+
+class DirectChecker(AppointmentChecker):
+    # AppointmentChecker without a browser: searches go straight to the
+    # mock's endpoint with a session cookie obtained from the mock itself
+    def __init__(self, site, base_url, **kwargs):
+        self.site = site
+        super().__init__('bench', 'bench', base_url=base_url, search_backend='http',
+                         search_endpoint=mock_srcei.SEARCH_ENDPOINT, **kwargs)
+        self.cookies = {mock_srcei.SESSION_COOKIE: site.login()}
+
+    def launch_browser(self):
+        return None, None
+
+    def prepare_search_form(self):
+        return False
+
+    def select_region(self, region_id):
+        pass
+
+    def create_search_backend(self, region_id, workers=1):
+        backend = HttpSearchBackend(self.base_url, self.search_endpoint, cookies=self.cookies,
+                                    office_codes=self.site.office_codes())
+        backend.prepare(region_id)
+        return backend
+
+def run_case(args, base_url, site, mode, workers, office_count, days, probe):
+    offices = [f'OFICINA {index}' for index in range(1, office_count + 1)]
+    results = []
+    scheduler = ProbeScheduler(args.deep_scan_interval) if probe else None
+
+    for _ in range(args.repeat):
+        state_dir = tempfile.mkdtemp()
+        notifier = RecordingNotifier()
+        store = SlotStore(os.path.join(state_dir, 'appointment_state.db'))
+        if args.backend == 'direct':
+            checker = DirectChecker(site, base_url, notifier=notifier, store=store)
+        else:
+            lean_profile = None
+            if args.lean:
+                lean_profile = {'block_types': DEFAULT_BLOCKED_TYPES, 'block_urls': DEFAULT_BLOCKED_URLS}
+            checker = AppointmentChecker('11111111-1', 'bench', base_url=base_url, notifier=notifier, store=store,
+                                         search_backend=args.backend, search_endpoint=mock_srcei.SEARCH_ENDPOINT,
+                                         lean_profile=lean_profile, cache_dir=args.cache_dir)
+        checker.state_file = os.path.join(state_dir, 'appointment_state.json')
+        try:
+            setup_started = time.monotonic()
+            checker.prepare_search_form()
+            setup_time = time.monotonic() - setup_started
+
+            searches_before = site.searches
+            started = time.monotonic()
+            found = checker.check_appointment(REGION, offices, days, workers=workers, scan_mode=mode,
+                                              scheduler=scheduler)
+            elapsed = time.monotonic() - started
+        finally:
+            checker.close()
+            notifier.close()
+            store.close()
+            shutil.rmtree(state_dir, ignore_errors=True)
+
+        expected = site.earliest(offices, days)
+        earliest = min(
+            (checker.parse_appointment_date(appointments[0]) for appointments in found.values()),
+            default=None
+        )
+        results.append({
+            'setup': setup_time,
+            'cycle': elapsed,
+            'searches': site.searches - searches_before,
+            'first_slot': notifier.first_slot_at - started if notifier.first_slot_at else None,
+            'correct': earliest == (expected[0] if expected else None)
+        })
+    return results
+
+def summarize(results):
+    cycle = statistics.median(result['cycle'] for result in results)
+    searches = statistics.median(result['searches'] for result in results)
+    first_slots = [result['first_slot'] for result in results if result['first_slot'] is not None]
+    return {
+        'setup': statistics.median(result['setup'] for result in results),
+        'cycle': cycle,
+        'searches': searches,
+        'rate': searches / cycle if cycle else 0.0,
+        'first_slot': statistics.median(first_slots) if first_slots else None,
+        'correct': all(result['correct'] for result in results)
+    }
+
+def parse_list(value, cast=str):
+    return [cast(item) for item in value.split(',') if item]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark scan strategies against the mock SRCEI site')
+    parser.add_argument('--backend', choices=['direct', 'http', 'selenium', 'cdp'], default='direct')
+    parser.add_argument('--modes', default='earliest,full', help='comma-separated SCAN_MODE values')
+    parser.add_argument('--workers', default='1,4', help='comma-separated SCAN_WORKERS values')
+    parser.add_argument('--offices', default='1,3,6', help='comma-separated office counts')
+    parser.add_argument('--days', default='7,30', help='comma-separated DAYS_TO_SEARCH values')
+    parser.add_argument('--probe', action='store_true', help='also run each case with the probe scheduler')
+    parser.add_argument('--deep-scan-interval', type=int, default=900)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--delay', type=float, default=0.05, help='mock search latency in seconds')
+    parser.add_argument('--fill-rate', type=float, default=0.2)
+    parser.add_argument('--page-size', type=int, default=12)
+    parser.add_argument('--single-day', action='store_true', help='mock answers only the requested day')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--lean', action='store_true', help='lean browser profile (selenium and http backends)')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    office_counts = parse_list(args.offices, int)
+    day_windows = parse_list(args.days, int)
+    site = mock_srcei.MockSite.generate(
+        [f'OFICINA {index}' for index in range(1, max(office_counts) + 1)],
+        days=max(day_windows), fill_rate=args.fill_rate, seed=args.seed, delay=args.delay,
+        page_size=args.page_size, require_session=True, region=REGION, single_day=args.single_day
+    )
+    server = mock_srcei.serve(site)
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    args.cache_dir = tempfile.mkdtemp()  # Browser HTTP cache shared by every run, as in main()
+
+    header = (f"{'mode':<9} {'probe':<5} {'workers':>7} {'offices':>7} {'days':>4} {'setup s':>8} "
+              f"{'cycle s':>8} {'searches':>8} {'search/s':>8} {'1st slot s':>10} {'earliest':>8}")
+    print(header)
+    print('-' * len(header))
+    probes = [False, True] if args.probe else [False]
+    try:
+        for mode, probe, workers, office_count, days in itertools.product(
+                parse_list(args.modes), probes, parse_list(args.workers, int), office_counts, day_windows):
+            summary = summarize(run_case(args, base_url, site, mode, workers, office_count, days, probe))
+            first_slot = f"{summary['first_slot']:.3f}" if summary['first_slot'] is not None else '-'
+            print(f"{mode:<9} {'yes' if probe else 'no':<5} {workers:>7} {office_count:>7} {days:>4} "
+                  f"{summary['setup']:>8.3f} {summary['cycle']:>8.3f} {summary['searches']:>8.0f} "
+                  f"{summary['rate']:>8.1f} {first_slot:>10} {'ok' if summary['correct'] else 'WRONG':>8}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(args.cache_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import os
+import struct
+import urllib.request
+from urllib.parse import urlsplit
+
+# A small Chrome DevTools Protocol client on asyncio: one websocket to the
+# browser (the same --remote-debugging-port Selenium's Chromium already
+# listens on) carrying commands for any number of tabs, each attached as a
+# flat session. Only what the scan needs: commands and their responses,
+# no event subscriptions.
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+class CDPError(Exception):
+    pass
+
+def apply_mask(payload, mask):
+    # XOR the payload with the 4-byte mask, as one big integer operation
+    if not payload:
+        return payload
+    repeated = (mask * (len(payload) // 4 + 1))[:len(payload)]
+    return (int.from_bytes(payload, 'big') ^ int.from_bytes(repeated, 'big')).to_bytes(len(payload), 'big')
+
+class WebSocket:
+    # Minimal RFC 6455 client: text frames out (masked), text frames in,
+    # with fragmentation, ping and close handled
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, url):
+        parts = urlsplit(url)
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+        key = base64.b64encode(os.urandom(16)).decode('ascii')
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+        writer.write((
+            f'GET {path} HTTP/1.1\r\n'
+            f'Host: {parts.netloc}\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            f'Sec-WebSocket-Key: {key}\r\n'
+            'Sec-WebSocket-Version: 13\r\n\r\n'
+        ).encode('ascii'))
+        await writer.drain()
+
+        response = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1')
+        status, *header_lines = response.split('\r\n')
+        if ' 101 ' not in status + ' ':
+            writer.close()
+            raise CDPError(f"Websocket handshake failed: {status}")
+        headers = {}
+        for line in header_lines:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii')).digest()).decode('ascii')
+        if headers.get('sec-websocket-accept') != accept:
+            writer.close()
+            raise CDPError("Websocket handshake failed: bad Sec-WebSocket-Accept")
+        return cls(reader, writer)
+
+    async def send(self, text, opcode=0x1):
+        payload = text.encode('utf-8') if isinstance(text, str) else text
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, 0x80 | length)
+        elif length < 1 << 16:
+            header = struct.pack('!BBH', 0x80 | opcode, 0x80 | 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 0x80 | 127, length)
+        mask = os.urandom(4)
+        self.writer.write(header + mask + apply_mask(payload, mask))
+        await self.writer.drain()
+
+    async def receive(self):
+        message = b''
+        while True:
+            first, second = await self.reader.readexactly(2)
+            fin, opcode = first & 0x80, first & 0x0F
+            length = second & 0x7F
+            if length == 126:
+                length, = struct.unpack('!H', await self.reader.readexactly(2))
+            elif length == 127:
+                length, = struct.unpack('!Q', await self.reader.readexactly(8))
+            mask = await self.reader.readexactly(4) if second & 0x80 else None
+            payload = await self.reader.readexactly(length)
+            if mask:
+                payload = apply_mask(payload, mask)
+
+            if opcode == 0x8:
+                raise ConnectionError("Websocket closed by the browser")
+            if opcode == 0x9:
+                await self.send(payload, opcode=0xA)
+                continue
+            if opcode == 0xA:
+                continue
+            message += payload
+            if fin:
+                return message.decode('utf-8')
+
+    async def close(self):
+        try:
+            await self.send(b'', opcode=0x8)
+        except (ConnectionError, OSError):
+            pass
+        self.writer.close()
+
+class CDPConnection:
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.ids = itertools.count(1)
+        self.pending = {}  # command id -> future
+        self.reader_task = asyncio.ensure_future(self._read())
+
+    @classmethod
+    async def connect_browser(cls, debugging_port, host='127.0.0.1'):
+        # The browser-level websocket, from which tabs are created and attached
+        def browser_url():
+            with urllib.request.urlopen(f'http://{host}:{debugging_port}/json/version', timeout=5) as response:
+                return json.load(response)['webSocketDebuggerUrl']
+        url = await asyncio.get_running_loop().run_in_executor(None, browser_url)
+        return cls(await WebSocket.connect(url))
+
+    async def _read(self):
+        try:
+            while True:
+                message = json.loads(await self.websocket.receive())
+                future = self.pending.pop(message.get('id'), None)
+                if future is None or future.done():
+                    continue  # An event, or a command we stopped waiting for
+                if 'error' in message:
+                    future.set_exception(CDPError(message['error'].get('message', str(message['error']))))
+                else:
+                    future.set_result(message.get('result', {}))
+        except (ConnectionError, asyncio.IncompleteReadError, OSError) as e:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f"DevTools connection lost: {str(e)}"))
+            self.pending.clear()
+
+    async def send(self, method, params=None, session_id=None, timeout=30):
+        command_id = next(self.ids)
+        command = {'id': command_id, 'method': method, 'params': params or {}}
+        if session_id:
+            command['sessionId'] = session_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[command_id] = future
+        await self.websocket.send(json.dumps(command))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(command_id, None)
+
+    async def open_tab(self, url):
+        target = await self.send('Target.createTarget', {'url': url})
+        session = await self.send('Target.attachToTarget', {'targetId': target['targetId'], 'flatten': True})
+        return Tab(self, target['targetId'], session['sessionId'])
+
+    async def close(self):
+        self.reader_task.cancel()
+        await self.websocket.close()
+
+class Tab:
+    def __init__(self, connection, target_id, session_id):
+        self.connection = connection
+        self.target_id = target_id
+        self.session_id = session_id
+
+    async def send(self, method, params=None, timeout=30):
+        return await self.connection.send(method, params, self.session_id, timeout)
+
+    async def call(self, function, *args, timeout=30):
+        # Runs a JavaScript function (source text) with JSON arguments,
+        # awaiting the promise it returns; JS exceptions become CDPError
+        expression = f"({function})({', '.join(json.dumps(arg) for arg in args)})"
+        result = await self.send('Runtime.evaluate', {
+            'expression': expression,
+            'awaitPromise': True,
+            'returnByValue': True
+        }, timeout=timeout)
+        if 'exceptionDetails' in result:
+            details = result['exceptionDetails']
+            description = details.get('exception', {}).get('description') or details.get('text', 'JavaScript error')
+            raise CDPError(description.split('\n')[0])
+        return result['result'].get('value')
+
+    async def close(self):
+        try:
+            await self.connection.send('Target.closeTarget', {'targetId': self.target_id}, timeout=5)
+        except (CDPError, ConnectionError, asyncio.TimeoutError):
+            pass
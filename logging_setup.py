@@ -0,0 +1,76 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import date, datetime
+
+# Logging that never blocks a scan: every logger hands its records to an
+# in-memory queue and a background listener thread formats them and writes
+# them to the console and to a rotating log file, either as text or as JSON
+# lines. Records can carry office, date, phase and duration fields, passed
+# with extra={...}; the JSON format keeps them as separate keys.
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+STRUCTURED_FIELDS = ('office', 'date', 'phase', 'duration')
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is None:
+                continue
+            if isinstance(value, (date, datetime)):
+                value = value.isoformat()
+            elif isinstance(value, float):
+                value = round(value, 3)
+            entry[field] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    # The stock QueueHandler formats the record (traceback included) on the
+    # logging thread and drops exc_info; only merge the message arguments
+    # here and leave the rest, tracebacks too, to the listener's formatters
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+def file_handler(path, max_bytes=10 * 1024 * 1024, backups=5, when=None):
+    # Rotates by time when `when` is set ('midnight', 'H', ...), by size otherwise
+    if when:
+        return logging.handlers.TimedRotatingFileHandler(path, when=when, backupCount=backups, encoding='utf-8')
+    return logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+
+def setup_logging(path='appointment_checker.log', level='INFO', json_lines=False,
+                  max_bytes=10 * 1024 * 1024, backups=5, when=None):
+    text = logging.Formatter(TEXT_FORMAT)
+    console = logging.StreamHandler()
+    console.setFormatter(text)
+    handlers = [console]
+    if path:
+        log_file = file_handler(path, max_bytes, backups, when)
+        log_file.setFormatter(JsonLinesFormatter() if json_lines else text)
+        handlers.append(log_file)
+
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(RecordQueueHandler(records))
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    listener.start()
+    # Flush whatever is still queued when the process exits
+    atexit.register(listener.stop)
+    return listener
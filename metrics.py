@@ -0,0 +1,198 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Minimal in-process metrics: timing spans around each phase of a run,
+# histograms per office and per date search, error and timeout counters,
+# exposed in the Prometheus text format and as a one-line summary per run.
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{format_labels(key)} {value}')
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.values = {}  # labels -> [bucket counts..., count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values.setdefault(key, [0] * len(self.buckets) + [0, 0.0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for key, series in sorted(self.values.items()):
+                for index, bound in enumerate(self.buckets):
+                    lines.append(f'{self.name}_bucket{format_labels(key + (("le", bound),))} {series[index]}')
+                lines.append(f'{self.name}_bucket{format_labels(key + (("le", "+Inf"),))} {series[-2]}')
+                lines.append(f'{self.name}_count{format_labels(key)} {series[-2]}')
+                lines.append(f'{self.name}_sum{format_labels(key)} {series[-1]:.6f}')
+        return lines
+
+class CycleStats:
+    # Totals for a single run, for the summary line logged at its end
+    def __init__(self):
+        self.started = time.monotonic()
+        self.phases = {}
+        self.searches = 0
+        self.search_time = 0.0
+        self.slowest_search = 0.0
+        self.errors = 0
+        self.timeouts = 0
+        self.office_time = {}
+        self.lock = threading.Lock()
+
+    def add_phase(self, phase, seconds):
+        with self.lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def add_search(self, office, seconds):
+        with self.lock:
+            self.office_time[office] = self.office_time.get(office, 0.0) + seconds
+            self.searches += 1
+            self.search_time += seconds
+            self.slowest_search = max(self.slowest_search, seconds)
+
+    def add_error(self, timeout=False):
+        with self.lock:
+            self.errors += 1
+            if timeout:
+                self.timeouts += 1
+
+    def summary(self):
+        parts = [f"Cycle took {time.monotonic() - self.started:.1f}s"]
+        parts.extend(f"{phase} {seconds:.2f}s" for phase, seconds in self.phases.items())
+        if self.searches:
+            parts.append(
+                f"{self.searches} searches (avg {self.search_time / self.searches:.2f}s, "
+                f"max {self.slowest_search:.2f}s)"
+            )
+        parts.append(f"{self.errors} errors ({self.timeouts} timeouts)")
+        return ', '.join(parts)
+
+class Metrics:
+    def __init__(self):
+        self.phase_seconds = Histogram('srcei_phase_seconds', 'Time spent in each phase of a run')
+        self.search_seconds = Histogram('srcei_search_seconds', 'Time taken by a single date search, per office')
+        self.office_seconds = Histogram('srcei_office_scan_seconds', 'Search time spent on an office during one run')
+        self.searches = Counter('srcei_searches_total', 'Date searches performed')
+        self.errors = Counter('srcei_errors_total', 'Errors by phase and exception type')
+        self.timeouts = Counter('srcei_timeouts_total', 'Timeouts by phase')
+        self.cycles = Counter('srcei_cycles_total', 'Completed runs')
+        self.cycle = CycleStats()
+
+    def start_cycle(self):
+        self.cycle = CycleStats()
+        return self.cycle
+
+    def end_cycle(self):
+        self.cycles.inc()
+        self.phase_seconds.observe(time.monotonic() - self.cycle.started, phase='cycle')
+        for office, seconds in self.cycle.office_time.items():
+            self.office_seconds.observe(seconds, office=office)
+        return self.cycle.summary()
+
+    def record_error(self, phase, error):
+        timeout = is_timeout(error)
+        self.errors.inc(phase=phase, error=type(error).__name__)
+        if timeout:
+            self.timeouts.inc(phase=phase)
+        self.cycle.add_error(timeout)
+
+    @contextmanager
+    def span(self, phase):
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.record_error(phase, e)
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            self.phase_seconds.observe(elapsed, phase=phase)
+            self.cycle.add_phase(phase, elapsed)
+            if LOGGER.isEnabledFor(logging.DEBUG):
+                LOGGER.debug(f"{phase} took {elapsed:.2f}s", extra={'phase': phase, 'duration': elapsed})
+
+    def observe_search(self, office, seconds, error=None):
+        self.searches.inc(office=office)
+        self.search_seconds.observe(seconds, office=office)
+        self.cycle.add_search(office, seconds)
+        if error is not None:
+            self.record_error('search', error)
+
+    def render(self):
+        lines = []
+        for metric in (self.phase_seconds, self.search_seconds, self.office_seconds,
+                       self.searches, self.errors, self.timeouts, self.cycles):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+def is_timeout(error):
+    # Selenium, httpx and the standard library all name their timeouts *Timeout*
+    return isinstance(error, TimeoutError) or any('Timeout' in cls.__name__ for cls in type(error).__mro__)
+
+METRICS = Metrics()
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = METRICS.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_metrics_server(port, host='127.0.0.1'):
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,360 @@
+import argparse
+import json
+import random
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+# Local stand-in for the SRCEI site: the ClaveÚnica login form, the module
+# list with the "Reimpresión cédula" button, and the reservation form with
+# region/office selects, the date search, its loader and the result cards.
+# Slot inventories and response delays are configurable, so the checker and
+# its scan strategies can be run and measured offline.
+
+MONTH_NAMES = [
+    'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio',
+    'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre'
+]
+
+BASE_PATH = '/ReservaDeHoraSRCEI/web'
+INIT_PATH = f'{BASE_PATH}/init.srcei'
+LOGIN_PATH = f'{BASE_PATH}/login.srcei'
+FORM_PATH = f'{BASE_PATH}/reserva.srcei'
+OFFICES_PATH = f'{BASE_PATH}/oficinas.srcei'
+SEARCH_ENDPOINT = f'{BASE_PATH}/buscarHoras.srcei'
+SESSION_COOKIE = 'JSESSIONID'
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>ClaveÚnica</title></head>
+<body>
+<form method="post" action="{login_path}">
+  <input id="cu_inputRUN" name="run" type="text">
+  <input id="cu_inputClaveUnica" name="password" type="password">
+  <button id="cu_btnIngresar" type="submit">Ingresar</button>
+</form>
+</body></html>
+"""
+
+MODULES_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Reserva de hora</title></head>
+<body>
+<button id="9" class="btn btn-light listaModulos" onclick="location.href='{form_path}'">Reimpresión cédula</button>
+</body></html>
+"""
+
+FORM_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Reimpresión cédula</title></head>
+<body>
+<select id="selectRegion">
+  <option value="">Seleccione región</option>
+  {regions}
+</select>
+<select id="selectOficinas"><option value="">Seleccione oficina</option></select>
+<input id="idFechaSeleccionadaDesde" type="text" readonly>
+<button id="idBtnBuscarFechaDisponible" type="button">Buscar</button>
+<div id="idBuscarHoraLoaderContainer" style="display: none">Cargando...</div>
+<div id="idHorasDisponiblesContainer"></div>
+<script>
+const region = document.getElementById('selectRegion');
+const offices = document.getElementById('selectOficinas');
+const loader = document.getElementById('idBuscarHoraLoaderContainer');
+region.addEventListener('change', () => {{
+  const xhr = new XMLHttpRequest();
+  xhr.open('GET', '{offices_path}?idRegion=' + encodeURIComponent(region.value));
+  xhr.onload = () => {{
+    offices.innerHTML = '<option value="">Seleccione oficina</option>';
+    for (const office of JSON.parse(xhr.responseText)) {{
+      const option = document.createElement('option');
+      option.value = office.id;
+      option.textContent = office.nombre;
+      offices.appendChild(option);
+    }}
+  }};
+  xhr.send();
+}});
+document.getElementById('idBtnBuscarFechaDisponible').addEventListener('click', () => {{
+  loader.style.display = 'block';
+  const xhr = new XMLHttpRequest();
+  xhr.open('POST', '{search_path}');
+  xhr.setRequestHeader('Content-Type', 'application/x-www-form-urlencoded');
+  xhr.onloadend = () => {{
+    document.getElementById('idHorasDisponiblesContainer').innerHTML = xhr.responseText;
+    loader.style.display = 'none';
+  }};
+  xhr.send(new URLSearchParams({{
+    idRegion: region.value,
+    idOficina: offices.value,
+    fechaSeleccionadaDesde: document.getElementById('idFechaSeleccionadaDesde').value
+  }}).toString());
+}});
+</script>
+</body></html>
+"""
+
+class MockSite:
+    def __init__(self, offices, delay=0.0, page_size=12, require_session=False,
+                 region='13', login_delay=0.0, session_ttl=None, single_day=False):
+        # offices: {office code: {'name': str, 'slots': [datetime, ...]}}
+        self.offices = offices
+        self.delay = delay
+        self.page_size = page_size
+        self.require_session = require_session
+        self.region = region
+        self.login_delay = login_delay
+        self.session_ttl = session_ttl
+        self.single_day = single_day  # Answer only the requested day instead of "from" it
+        self.sessions = {}
+        self.searches = 0
+        self.logins = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def generate(cls, office_names, days=30, slots_per_day=3, fill_rate=0.3, seed=None, **kwargs):
+        rng = random.Random(seed)
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        offices = {}
+        for index, name in enumerate(office_names, start=1):
+            slots = []
+            for day in range(days):
+                if rng.random() >= fill_rate:
+                    continue
+                for _ in range(slots_per_day):
+                    slots.append(start + timedelta(days=day, hours=rng.randint(8, 13), minutes=rng.choice(range(0, 60, 2))))
+            offices[str(index)] = {'name': name, 'slots': sorted(set(slots))}
+        return cls(offices, **kwargs)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        # {"1": {"name": "PROVIDENCIA", "slots": ["2024-04-07 08:46", ...]}, ...}
+        with open(path) as f:
+            data = json.load(f)
+        offices = {
+            code: {
+                'name': office['name'],
+                'slots': sorted(datetime.strptime(slot, '%Y-%m-%d %H:%M') for slot in office['slots'])
+            }
+            for code, office in data.items()
+        }
+        return cls(offices, **kwargs)
+
+    def office_codes(self):
+        return {office['name']: code for code, office in self.offices.items()}
+
+    def earliest(self, office_names=None, days=None):
+        # Ground truth for benchmarks: the earliest slot within the window
+        start = datetime.now().date()
+        best = None
+        for office in self.offices.values():
+            if office_names is not None and office['name'] not in office_names:
+                continue
+            for slot in office['slots']:
+                if slot.date() < start or (days is not None and (slot.date() - start).days >= days):
+                    continue
+                if best is None or slot < best[0]:
+                    best = (slot, office['name'])
+                break
+        return best
+
+    def login(self):
+        if self.login_delay:
+            time.sleep(self.login_delay)
+        token = secrets.token_hex(16)
+        with self.lock:
+            self.logins += 1
+            self.sessions[token] = time.monotonic()
+        return token
+
+    def is_valid_session(self, token):
+        with self.lock:
+            created = self.sessions.get(token)
+        if created is None:
+            return False
+        return self.session_ttl is None or time.monotonic() - created < self.session_ttl
+
+    def search(self, office_code, date_from):
+        # "Desde" semantics: slots from the given date onwards, one page at a time
+        with self.lock:
+            self.searches += 1
+        office = self.offices.get(office_code)
+        if office is None:
+            return []
+        slots = [slot for slot in office['slots'] if slot.date() >= date_from.date()]
+        if self.single_day:
+            slots = [slot for slot in slots if slot.date() == date_from.date()]
+        return slots[:self.page_size]
+
+    def render_cards(self, slots):
+        cards = []
+        for slot in slots:
+            cards.append(
+                '<div class="card"><div class="card-body">'
+                f'<h1>{slot.day:02d}</h1><h5>{MONTH_NAMES[slot.month - 1]}</h5><h6>{slot:%H:%M}</h6>'
+                '</div></div>'
+            )
+        # Hidden template card, like the real page keeps around
+        cards.append('<div class="card" style="display: none"><h1></h1><h5></h5><h6></h6></div>')
+        return '\n'.join(cards)
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    site = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type='text/html; charset=utf-8', headers=None):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def redirect(self, location, headers=None):
+        self.send_body(302, '', headers=dict(headers or {}, Location=location))
+
+    def session_token(self):
+        for part in (self.headers.get('Cookie') or '').split(';'):
+            name, _, value = part.strip().partition('=')
+            if name == SESSION_COOKIE:
+                return value
+        return None
+
+    def has_session(self):
+        token = self.session_token()
+        if not self.site.require_session:
+            return True
+        return token is not None and self.site.is_valid_session(token)
+
+    def handle_init(self):
+        if self.session_token() and self.site.is_valid_session(self.session_token()):
+            self.send_body(200, MODULES_PAGE.format(form_path=FORM_PATH))
+        else:
+            self.send_body(200, LOGIN_PAGE.format(login_path=LOGIN_PATH))
+
+    def handle_login(self, params):
+        if not params.get('run') or not params.get('password'):
+            self.redirect(INIT_PATH)
+            return
+        token = self.site.login()
+        self.redirect(INIT_PATH, {'Set-Cookie': f'{SESSION_COOKIE}={token}; Path=/; HttpOnly'})
+
+    def handle_form(self):
+        if not self.has_session():
+            self.redirect(INIT_PATH)
+            return
+        regions = f'<option value="{escape(self.site.region)}">Región {escape(self.site.region)}</option>'
+        self.send_body(200, FORM_PAGE.format(
+            regions=regions, offices_path=OFFICES_PATH, search_path=SEARCH_ENDPOINT
+        ))
+
+    def handle_offices(self, params):
+        if not self.has_session():
+            self.redirect(INIT_PATH)
+            return
+        offices = []
+        if params.get('idRegion') == self.site.region:
+            offices = [{'id': code, 'nombre': office['name']} for code, office in self.site.offices.items()]
+        self.send_body(200, json.dumps(offices), content_type='application/json')
+
+    def handle_search(self, params):
+        if not self.has_session():
+            self.redirect(INIT_PATH)
+            return
+        try:
+            date_from = datetime.strptime(params.get('fechaSeleccionadaDesde', ''), '%d/%m/%Y')
+        except ValueError:
+            self.send_body(400, 'invalid date')
+            return
+        if self.site.delay:
+            time.sleep(self.site.delay)
+        slots = self.site.search(params.get('idOficina', ''), date_from)
+        self.send_body(200, self.site.render_cards(slots))
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        params = dict(parse_qsl(parts.query))
+        if parts.path == INIT_PATH:
+            self.handle_init()
+        elif parts.path == FORM_PATH:
+            self.handle_form()
+        elif parts.path == OFFICES_PATH:
+            self.handle_offices(params)
+        elif parts.path == SEARCH_ENDPOINT:
+            self.handle_search(params)
+        else:
+            self.send_body(404, 'not found')
+
+    def do_POST(self):
+        parts = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        params = dict(parse_qsl(self.rfile.read(length).decode('utf-8')))
+        if parts.path == LOGIN_PATH:
+            self.handle_login(params)
+        elif parts.path == SEARCH_ENDPOINT:
+            self.handle_search(params)
+        else:
+            self.send_body(404, 'not found')
+
+def serve(site, host='127.0.0.1', port=0):
+    # Start the mock site on a background thread; port 0 picks a free port
+    handler = type('BoundMockRequestHandler', (MockRequestHandler,), {'site': site})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline stand-in for the SRCEI appointment site')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--inventory', help='JSON file with offices and slots')
+    parser.add_argument('--offices', default='PROVIDENCIA,ÑUÑOA,LAS CONDES',
+                        help='comma-separated office names for a generated inventory')
+    parser.add_argument('--region', default='13')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--fill-rate', type=float, default=0.3)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds to wait before answering a search')
+    parser.add_argument('--login-delay', type=float, default=0.0, help='seconds to wait before accepting a login')
+    parser.add_argument('--session-ttl', type=float, help='seconds until a login session expires')
+    parser.add_argument('--page-size', type=int, default=12)
+    parser.add_argument('--single-day', action='store_true', help='answer searches with the requested day only')
+    args = parser.parse_args()
+
+    options = {
+        'delay': args.delay,
+        'page_size': args.page_size,
+        'require_session': True,
+        'region': args.region,
+        'login_delay': args.login_delay,
+        'session_ttl': args.session_ttl,
+        'single_day': args.single_day
+    }
+    if args.inventory:
+        site = MockSite.from_file(args.inventory, **options)
+    else:
+        site = MockSite.generate(args.offices.split(','), days=args.days, fill_rate=args.fill_rate,
+                                 seed=args.seed, **options)
+
+    server = serve(site, args.host, args.port)
+    base_url = f"http://{args.host}:{server.server_address[1]}"
+    print(f"Mock SRCEI site on {base_url}{INIT_PATH}")
+    print(f"  SRCEI_BASE_URL={base_url}")
+    print(f"  SEARCH_ENDPOINT={SEARCH_ENDPOINT}")
+    print(f"  REGION={args.region}")
+    for name, code in site.office_codes().items():
+        print(f"  {code}: {name} ({len(site.offices[code]['slots'])} slots)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import threading
+import time
+
+from telegram import Bot
+from telegram.error import RetryAfter, TelegramError
+
+# Telegram notifications sent from a background thread with one long-lived
+# event loop and a single Bot (and so a single pooled HTTP connection).
+# Callers only enqueue messages, so a slow or unavailable Telegram never
+# holds up a scan. Slot notifications arriving within coalesce_window
+# seconds of each other are merged into one message with the best slot.
+
+class TelegramNotifier:
+    def __init__(self, token, chat_id, coalesce_window=5.0, max_attempts=6,
+                 initial_backoff=1.0, max_backoff=300.0):
+        self.token = token
+        self.chat_id = chat_id
+        self.coalesce_window = coalesce_window
+        self.max_attempts = max_attempts
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.logger = logging.getLogger(__name__)
+        # chat_id is the default chat; messages can also name their own
+        self.enabled = bool(token)
+        self.pending_slots = {}  # (chat id, subscriber) -> burst of slot notifications waiting to be merged
+        self.loop = None
+        self.queue = None
+        self.thread = None
+        self.ready = threading.Event()
+        if self.enabled:
+            self.thread = threading.Thread(target=self._run, name='telegram-notifier', daemon=True)
+            self.thread.start()
+            self.ready.wait()
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.queue = asyncio.Queue()
+        self.ready.set()
+        self.loop.run_until_complete(self._worker())
+        self.loop.close()
+
+    def notify(self, message, chat_id=None):
+        # Queue a message as is; never blocks
+        self._enqueue(message, chat_id)
+
+    def notify_slot(self, appointment, office, previous=None, chat_id=None, subscriber=None):
+        # Queue an "earlier appointment" notification. A burst of them for the
+        # same subscriber within the coalesce window becomes one message from
+        # the slot they last heard about (previous) to the best one found.
+        # Subscribers sharing the default chat still get separate bursts.
+        chat_id = chat_id or self.chat_id
+        if not self.enabled or not chat_id:
+            return
+        self.loop.call_soon_threadsafe(self._add_slot, (chat_id, subscriber), appointment, office, previous)
+
+    def _enqueue(self, message, chat_id=None):
+        chat_id = chat_id or self.chat_id
+        if not self.enabled or not chat_id:
+            return
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (chat_id, message))
+
+    def _add_slot(self, burst_key, appointment, office, previous):
+        burst = self.pending_slots.get(burst_key)
+        if burst is None:
+            self.pending_slots[burst_key] = {'previous': previous, 'appointment': appointment, 'office': office}
+            self.loop.call_later(self.coalesce_window, self._flush_slots, burst_key)
+        else:
+            burst['appointment'] = appointment
+            burst['office'] = office
+
+    def _flush_slots(self, burst_key):
+        burst = self.pending_slots.pop(burst_key, None)
+        if burst is None:
+            return
+        chat_id = burst_key[0]
+        if burst['previous']:
+            message = (
+                f"New earlier appointment found!\n"
+                f"Previous: {burst['previous']}\n"
+                f"New: {burst['appointment']} at {burst['office']}"
+            )
+        else:
+            message = (
+                f"First appointment found!\n"
+                f"Date: {burst['appointment']} at {burst['office']}"
+            )
+        self.queue.put_nowait((chat_id, message))
+
+    async def _worker(self):
+        bot = Bot(self.token)
+        try:
+            await bot.initialize()
+        except TelegramError as e:
+            # Sending still works without it; failed sends are retried below
+            self.logger.warning(f"Could not initialize Telegram bot: {str(e)}")
+        try:
+            while True:
+                item = await self.queue.get()
+                if item is None:
+                    break
+                await self._send(bot, *item)
+        finally:
+            await bot.shutdown()
+
+    async def _send(self, bot, chat_id, message):
+        delay = self.initial_backoff
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await bot.send_message(chat_id=chat_id, text=message)
+                return
+            except RetryAfter as e:
+                wait = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+            except TelegramError as e:
+                self.logger.warning(f"Telegram send failed (attempt {attempt}/{self.max_attempts}): {str(e)}")
+                wait = delay
+                delay = min(delay * 2, self.max_backoff)
+            if attempt < self.max_attempts:
+                await asyncio.sleep(wait)
+        self.logger.error(f"Dropping Telegram message after {self.max_attempts} attempts: {message}")
+
+    def close(self, timeout=10):
+        # Send whatever is still pending (including open bursts), then stop
+        if not self.enabled or not self.thread.is_alive():
+            return
+
+        def stop():
+            for burst_key in list(self.pending_slots):
+                self._flush_slots(burst_key)
+            self.queue.put_nowait(None)
+
+        self.loop.call_soon_threadsafe(stop)
+        self.thread.join(timeout)
+
+class RecordingNotifier(TelegramNotifier):
+    # Keeps messages in memory instead of sending them (benchmarks, dry runs)
+    def __init__(self, coalesce_window=0.0):
+        super().__init__('recording', 'recording', coalesce_window=coalesce_window)
+        self.messages = []
+        self.first_slot_at = None
+
+    def notify_slot(self, appointment, office, previous=None, chat_id=None, subscriber=None):
+        if self.first_slot_at is None:
+            self.first_slot_at = time.monotonic()
+        super().notify_slot(appointment, office, previous, chat_id, subscriber)
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                break
+            self.messages.append(item[1])
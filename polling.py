@@ -0,0 +1,57 @@
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+# Picks the wait before the next run from when new slots have shown up in
+# the past: the store logs every release with its office and time, and hours
+# of the day with more releases than average get polled more often (and
+# quiet hours less), within min_interval and max_interval. An optional
+# budget caps the number of searches per hour whatever the schedule says.
+
+MIN_RELEASES = 10  # Below this there is no pattern to follow yet
+
+class AdaptivePoller:
+    def __init__(self, store, base_interval=60, min_interval=20, max_interval=600, budget=0, history_days=14):
+        self.store = store
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.budget = budget  # Searches per hour, 0 for no limit
+        self.history_days = history_days
+        self.runs = deque()  # (monotonic time, searches) for the runs of the last hour
+        self.logger = logging.getLogger(__name__)
+
+    def record_run(self, searches):
+        now = time.monotonic()
+        self.runs.append((now, searches))
+        while self.runs and self.runs[0][0] < now - 3600:
+            self.runs.popleft()
+
+    def interval_for(self, counts, hour):
+        # Twice the average number of releases -> half the base interval
+        mean = sum(counts) / len(counts)
+        heat = (counts[hour] + 1) / (mean + 1)
+        return min(max(self.base_interval / heat, self.min_interval), self.max_interval)
+
+    def next_interval(self, offices=None, now=None):
+        now = now or datetime.now()
+        counts = self.store.release_counts(time.time() - self.history_days * 86400, offices)
+        if sum(counts) < MIN_RELEASES:
+            interval = self.base_interval
+        else:
+            interval = self.interval_for(counts, now.hour)
+            # Wake up when a busier hour starts rather than sleep through its beginning
+            next_hour = (now + timedelta(hours=1)).replace(minute=0, second=0, microsecond=0)
+            until_next_hour = (next_hour - now).total_seconds()
+            if until_next_hour < interval and self.interval_for(counts, next_hour.hour) < interval:
+                interval = max(until_next_hour, self.min_interval)
+
+        if self.budget and self.runs:
+            # Space runs so that the average run fits the hourly search budget
+            searches_per_run = sum(searches for _, searches in self.runs) / len(self.runs)
+            budget_interval = 3600 * searches_per_run / self.budget
+            if budget_interval > interval:
+                self.logger.info(f"Search budget of {self.budget}/hour limits the next run to {budget_interval:.0f}s")
+                interval = budget_interval
+        return interval
@@ -0,0 +1,122 @@
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from slots import Slot
+
+# Slot history in SQLite (WAL mode). Every slot seen is kept with the time it
+# was first and last seen, so we can tell when slots get released and taken.
+# The appointment we last told the user about ("earliest") lives next to it,
+# replacing appointment_state.json. All writes for one search go in a single
+# transaction, so a crash never leaves half-written state behind.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS slots (
+    office TEXT NOT NULL,
+    slot_at TEXT NOT NULL,
+    label TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (office, slot_at)
+);
+CREATE TABLE IF NOT EXISTS releases (
+    office TEXT NOT NULL,
+    slot_at TEXT NOT NULL,
+    released_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS releases_by_time ON releases (released_at, office);
+CREATE TABLE IF NOT EXISTS earliest (
+    key TEXT PRIMARY KEY,
+    office TEXT NOT NULL,
+    slot_at TEXT NOT NULL,
+    label TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+SLOT_FORMAT = '%Y-%m-%d %H:%M'
+
+def row_to_slot(row):
+    office, label, slot_at = row
+    return Slot.at_time(office, label, datetime.strptime(slot_at, SLOT_FORMAT))
+
+class SlotStore:
+    def __init__(self, path='appointment_state.db'):
+        self.path = path
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        # WAL with synchronous=NORMAL survives crashes; only an OS crash
+        # can lose the last commits, never corrupt the database
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+
+    def get_earliest(self, key='earliest'):
+        # The Slot the user was last told about, or None
+        row = self.db.execute('SELECT office, label, slot_at FROM earliest WHERE key = ?', (key,)).fetchone()
+        return row_to_slot(row) if row else None
+
+    def set_earliest(self, slot, key='earliest'):
+        self.record_search([], earliest={key: slot})
+
+    def clear_earliest(self, key='earliest'):
+        with self.transaction():
+            self.db.execute('DELETE FROM earliest WHERE key = ?', (key,))
+
+    def record_search(self, slots, earliest=None, seen_at=None, released=()):
+        # Store the slots returned by one search and, if given, the new
+        # earliest slots ({key: Slot}), atomically. released are the slots
+        # the caller saw appear (or come back) in a part of the calendar it
+        # had searched before, logged as releases. Returns the slots never
+        # seen before.
+        seen_at = time.time() if seen_at is None else seen_at
+        new_slots = []
+        with self.transaction():
+            for slot in slots:
+                slot_at = slot.at.strftime(SLOT_FORMAT)
+                # No upsert with RETURNING, it needs SQLite 3.35
+                cursor = self.db.execute(
+                    'INSERT OR IGNORE INTO slots (office, slot_at, label, first_seen, last_seen) VALUES (?, ?, ?, ?, ?)',
+                    (slot.office, slot_at, slot.label, seen_at, seen_at)
+                )
+                if cursor.rowcount == 1:
+                    new_slots.append(slot)
+                else:
+                    self.db.execute('UPDATE slots SET last_seen = ? WHERE office = ? AND slot_at = ?',
+                                    (seen_at, slot.office, slot_at))
+            self.db.executemany(
+                'INSERT INTO releases (office, slot_at, released_at) VALUES (?, ?, ?)',
+                [(slot.office, slot.at.strftime(SLOT_FORMAT), seen_at) for slot in released]
+            )
+            self.db.executemany(
+                'INSERT OR REPLACE INTO earliest (key, office, slot_at, label, updated_at) VALUES (?, ?, ?, ?, ?)',
+                [(key, slot.office, slot.at.strftime(SLOT_FORMAT), slot.label, seen_at)
+                 for key, slot in (earliest or {}).items()]
+            )
+        return new_slots
+
+    def release_counts(self, since, offices=None):
+        # New slots per local hour of day (a list of 24 counts) since the given time
+        query = ("SELECT CAST(strftime('%H', released_at, 'unixepoch', 'localtime') AS INTEGER), COUNT(*) "
+                 "FROM releases WHERE released_at >= ?")
+        params = [since]
+        if offices:
+            query += f" AND office IN ({','.join('?' * len(offices))})"
+            params.extend(offices)
+        counts = [0] * 24
+        for hour, count in self.db.execute(query + ' GROUP BY 1', params):
+            counts[hour] = count
+        return counts
+
+    @contextmanager
+    def transaction(self):
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            yield self.db
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        self.db.execute('COMMIT')
+
+    def close(self):
+        self.db.close()
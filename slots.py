@@ -0,0 +1,118 @@
+from datetime import date, datetime, timedelta
+
+# Appointment slots as small hashable objects: the office, the label shown
+# on the site ("07 Abril 08:46") and the slot time as integer seconds. Labels
+# are parsed once per card; comparisons and hashing only touch integers.
+
+MONTHS = {
+    'Enero': 1, 'Febrero': 2, 'Marzo': 3, 'Abril': 4,
+    'Mayo': 5, 'Junio': 6, 'Julio': 7, 'Agosto': 8,
+    'Septiembre': 9, 'Octubre': 10, 'Noviembre': 11, 'Diciembre': 12
+}
+
+EPOCH = datetime(1970, 1, 1)
+
+def to_timestamp(moment):
+    # Wall-clock time as seconds, without any timezone conversion
+    return int((moment - EPOCH).total_seconds())
+
+def parse_label(label, today=None):
+    # "07 Abril 08:46" -> datetime. The site never offers past appointments,
+    # so a day and month earlier than today belong to next year.
+    today = today or date.today()
+    day, month, time = label.split()
+    month = MONTHS[month.capitalize()]
+    hour, minute = map(int, time.split(':'))
+    for year in range(today.year, today.year + 5):
+        try:
+            moment = datetime(year, month, int(day), hour, minute)
+        except ValueError:  # 29 Febrero outside a leap year
+            continue
+        if moment.date() >= today:
+            return moment
+    raise ValueError(f"Invalid appointment date: {label}")
+
+class Slot:
+    __slots__ = ('office', 'label', 'timestamp')
+
+    def __init__(self, office, label, timestamp):
+        self.office = office
+        self.label = label
+        self.timestamp = timestamp
+
+    @classmethod
+    def parse(cls, office, label, today=None):
+        return cls(office, label, to_timestamp(parse_label(label, today)))
+
+    @classmethod
+    def at_time(cls, office, label, moment):
+        return cls(office, label, to_timestamp(moment))
+
+    @property
+    def at(self):
+        return EPOCH + timedelta(seconds=self.timestamp)
+
+    def __eq__(self, other):
+        if not isinstance(other, Slot):
+            return NotImplemented
+        return self.timestamp == other.timestamp and self.office == other.office
+
+    def __hash__(self):
+        return hash((self.timestamp, self.office))
+
+    def __lt__(self, other):
+        return (self.timestamp, self.office) < (other.timestamp, other.office)
+
+    def __repr__(self):
+        return f"Slot({self.office!r}, {self.label!r})"
+
+    def __str__(self):
+        return f"{self.label} at {self.office}"
+
+class SlotDiff:
+    __slots__ = ('added', 'removed')
+
+    def __init__(self, added, removed):
+        self.added = added
+        self.removed = removed
+
+class OfficeScan:
+    # What we believe is on one office's calendar, kept from run to run: each
+    # search replaces the part of the calendar it showed (start to end, as
+    # timestamps) with what it found there. covered_through is how far
+    # searches starting on the first day have reached, as a timestamp; a
+    # slot new within it was released, a later one just came into view.
+    __slots__ = ('slots', 'covered_through')
+
+    def __init__(self, slots=()):
+        self.slots = set(slots)
+        self.covered_through = None
+
+    def covers(self, slot):
+        return self.covered_through is not None and slot.timestamp <= self.covered_through
+
+    def extend(self, end):
+        if self.covered_through is None or end > self.covered_through:
+            self.covered_through = end
+
+    def within(self, start, end):
+        return {slot for slot in self.slots if start <= slot.timestamp <= end}
+
+    def replace(self, start, end, slots):
+        self.slots.difference_update(self.within(start, end))
+        self.slots.update(slots)
+
+    def drop_before(self, timestamp):
+        self.slots = {slot for slot in self.slots if slot.timestamp >= timestamp}
+
+def diff_slots(previous, current):
+    # Compares two snapshots (previous must be a set) in one pass over each:
+    # the slots that appeared and the ones that are gone
+    added = []
+    seen = set()
+    for slot in current:
+        seen.add(slot)
+        if slot not in previous:
+            added.append(slot)
+    removed = [slot for slot in previous if slot not in seen]
+    return SlotDiff(added, removed)
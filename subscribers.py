@@ -0,0 +1,66 @@
+import json
+
+# People watching for appointments. Each subscriber has their own offices,
+# day window and Telegram chat, and their own "earliest" appointment in the
+# store; offices shared between subscribers are only searched once a run.
+#
+# SUBSCRIBERS_FILE points to a JSON list such as:
+#
+#   [
+#     {"name": "ana", "region": "13", "offices": ["PROVIDENCIA", "ÑUÑOA"],
+#      "days_to_search": 30, "telegram_chat_id": "123456"},
+#     {"name": "luis", "region": "13", "offices": ["ÑUÑOA"], "days_to_search": 7,
+#      "telegram_chat_id": "654321"}
+#   ]
+
+class Subscriber:
+    def __init__(self, name, region, offices, days_to_search=30, chat_id=None):
+        self.name = name
+        self.region = str(region)
+        self.offices = list(offices)
+        self.days_to_search = days_to_search
+        self.chat_id = chat_id
+
+    @property
+    def state_key(self):
+        # The single subscriber configured through .env keeps the original key
+        return f'earliest:{self.name}' if self.name else 'earliest'
+
+    @property
+    def log_prefix(self):
+        return f"[{self.name}] " if self.name else ''
+
+def load_subscribers(path, default_days=30):
+    with open(path, 'r') as f:
+        entries = json.load(f)
+    if isinstance(entries, dict):
+        entries = entries.get('subscribers', [])
+
+    subscribers = []
+    names = set()
+    for entry in entries:
+        missing = [field for field in ('name', 'region', 'offices') if not entry.get(field)]
+        if missing:
+            raise ValueError(f"Subscriber {entry.get('name', '?')} is missing {', '.join(missing)}")
+        if entry['name'] in names:
+            raise ValueError(f"Duplicate subscriber name: {entry['name']}")
+        names.add(entry['name'])
+        offices = entry['offices']
+        if isinstance(offices, str):
+            offices = offices.split(',')
+        subscribers.append(Subscriber(
+            entry['name'],
+            entry['region'],
+            [office.strip() for office in offices if office.strip()],
+            int(entry.get('days_to_search', default_days)),
+            str(entry['telegram_chat_id']) if entry.get('telegram_chat_id') else None
+        ))
+    if not subscribers:
+        raise ValueError(f"No subscribers in {path}")
+    return subscribers
+
+def group_by_region(subscribers):
+    regions = {}
+    for subscriber in subscribers:
+        regions.setdefault(subscriber.region, []).append(subscriber)
+    return regions